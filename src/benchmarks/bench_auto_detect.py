@@ -0,0 +1,101 @@
+"""
+Move registration latency of the automatic mode on a synthetic 30 fps
+sequence: the board is still, a hand sweeps over it and moves a piece,
+then leaves. The latency is measured from the last frame with the hand to
+the "board changed" reading, in frame time. The button path is shown for
+comparison as the sampling window it needs after the press, on top of the
+player's reaction time.
+
+Run from the src directory: python benchmarks/bench_auto_detect.py
+"""
+
+import os
+import sys
+import cv2
+import numpy as np
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bench_detection_fps import BIG_CROP, SMALL_CROP, FakeGrabber, board_frame
+from vision.chessviz import ChessViz
+from vision.pipeline import marker_records
+from vision.voting import EMPTY, PIECE_CODES, add_votes
+
+FPS = 30
+
+
+def moved_piece(frame, source, target):
+    """
+    Copy of a board frame with the marker on square source moved to target
+    """
+    frame = frame.copy()
+    square = SMALL_CROP[1] // 8
+    (y, x), (ty, tx) = [
+        (SMALL_CROP[0][0] + row * square, SMALL_CROP[0][1] + column * square)
+        for row, column in (source, target)
+    ]
+    frame[ty : ty + square, tx : tx + square] = frame[y : y + square, x : x + square]
+    frame[y : y + square, x : x + square] = 200
+    return frame
+
+
+def with_hand(frame, step, steps):
+    """
+    Frame with a hand-sized blob part way across the board
+    """
+    frame = frame.copy()
+    x = int(60 + 360 * step / max(1, steps - 1))
+    cv2.ellipse(frame, (x, 200), (80, 150), 0, 0, 360, (120, 150, 190), -1)
+    return frame
+
+
+def sequence(still=20, hand=30, after=40):
+    before = board_frame()
+    moved = moved_piece(before, (1, 4), (3, 4))
+    frames = [before] * still
+    frames += [with_hand(before if i < hand // 2 else moved, i, hand) for i in range(hand)]
+    return frames + [moved] * after, still + hand - 1
+
+
+def main():
+    with open("config.yaml", "r", encoding="utf-8") as config_file:
+        settings = yaml.safe_load(config_file)["vision"]
+    frames, hand_left = sequence()
+
+    import vision.chessviz
+
+    vision.chessviz.get_grabber = lambda cam_index, settings: FakeGrabber(frames[0])
+    auto_detect = dict(settings["auto_detect"], enabled=True)
+    chessviz = ChessViz(BIG_CROP, SMALL_CROP, sampling=settings["sampling"], auto_detect=auto_detect)
+
+    sample = np.full((8, 8), EMPTY, dtype=np.int8)
+    readings = []
+    for index, image in enumerate(frames):
+        crop = chessviz.get_crop(image, chessviz.big_crop)
+        records = marker_records(*chessviz.detect(crop))
+        sample.fill(EMPTY)
+        chessviz.vote(records, sample)
+        if chessviz.watch_board(crop, records, sample, settings["sample_size"], index / FPS):
+            readings.append(index)
+
+    changed = [index for index in readings if index > hand_left]
+    print(f"Readings at frames {readings}, hand left after frame {hand_left}")
+    if changed:
+        print(f"auto:   board changed {(changed[0] - hand_left) / FPS:.2f}s after the hand left")
+    else:
+        print("auto:   no reading after the hand left")
+
+    # button: a fresh sampling window after the press, on the still board
+    counts = np.zeros((8, 8, PIECE_CODES + 1), dtype=np.int16)
+    window = 0
+    while not (window and chessviz.sampling_done(counts, window, settings["sample_size"])):
+        crop = chessviz.get_crop(frames[-1], chessviz.big_crop)
+        sample.fill(EMPTY)
+        chessviz.vote(marker_records(*chessviz.detect(crop)), sample)
+        add_votes(counts, sample)
+        window += 1
+    print(f"button: reaction time + {window / FPS:.2f}s sampling ({window} frames)")
+
+
+if __name__ == "__main__":
+    main()
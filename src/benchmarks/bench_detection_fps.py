@@ -0,0 +1,126 @@
+"""
+Frames per second of the vision detection loop on a synthetic board frame:
+headless (detect and vote only) against drawing the overlay on every frame
+as chess_array_update_thread did before. imshow and waitKey are left out,
+so the overlay numbers are an upper bound for a real window.
+
+The multi-process pipeline is measured on a looping video of the same
+frame, with an increasing number of detector processes.
+
+Run from the src directory: python benchmarks/bench_detection_fps.py
+"""
+
+import os
+import sys
+import tempfile
+import time
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from vision.chessviz import ChessViz
+from vision.homography import crop_homography
+from vision.pipeline import VisionPipeline, marker_records
+from vision.voting import EMPTY
+
+BIG_CROP = [[0, 0], 480]
+SMALL_CROP = [[40, 40], 400]
+SECONDS = 3.0
+
+
+class FakeGrabber:
+    """
+    Stand-in for the camera grabber that always returns the same frame
+    """
+
+    def __init__(self, frame):
+        self.frame = frame
+        self.resolution = (frame.shape[1], frame.shape[0])
+
+    def latest(self):
+        return self.frame, 0.0, 0
+
+
+def board_frame():
+    """
+    640x480 frame with a marker on every square of the first and last two ranks
+    """
+    frame = np.full((480, 640, 3), 200, dtype=np.uint8)
+    square = SMALL_CROP[1] // 8
+    for row in (0, 1, 6, 7):
+        for column in range(8):
+            marker = cv2.aruco.generateImageMarker(
+                ChessViz.ARUCO_DICT, (row * 8 + column) % 12, square - 16
+            )
+            y = SMALL_CROP[0][0] + row * square + 8
+            x = SMALL_CROP[0][1] + column * square + 8
+            frame[y : y + square - 16, x : x + square - 16] = marker[..., np.newaxis]
+    return frame
+
+
+def measure(chessviz, image, overlay):
+    sample = np.full((8, 8), EMPTY, dtype=np.int8)
+    frames = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < SECONDS:
+        crop = chessviz.get_crop(image, chessviz.big_crop)
+        corners, ids = chessviz.detect(crop)
+        records = marker_records(corners, ids)
+        if overlay:
+            chessviz.draw_overlay(crop.copy(), records, corners)
+        chessviz.vote(records, sample)
+        frames += 1
+    return frames / (time.perf_counter() - start), len(records)
+
+
+def measure_pipeline(video, detectors):
+    pipeline = VisionPipeline(video, {}, BIG_CROP, detectors=detectors)
+    chessviz = ChessViz.__new__(ChessViz)  # only vote() is needed
+    chessviz.homography = crop_homography(40, 40, SMALL_CROP[1] // 8)
+    sample = np.full((8, 8), EMPTY, dtype=np.int8)
+    pipeline.next_records(timeout=30)  # wait until the detectors are up
+    frames = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < SECONDS:
+        detection = pipeline.next_records()
+        if detection is not None:
+            chessviz.vote(detection[1], sample)
+            frames += 1
+    fps = frames / (time.perf_counter() - start)
+    pipeline.stop()
+    return fps
+
+
+def write_video(path, image, frames=60):
+    writer = cv2.VideoWriter(
+        path, cv2.VideoWriter_fourcc(*"MJPG"), 30, (image.shape[1], image.shape[0])
+    )
+    for _ in range(frames):
+        writer.write(image)
+    writer.release()
+
+
+def main():
+    import vision.chessviz
+
+    image = board_frame()
+    vision.chessviz.get_grabber = lambda cam_index, settings: FakeGrabber(image)
+    chessviz = ChessViz(BIG_CROP, SMALL_CROP)
+
+    headless, markers = measure(chessviz, image, overlay=False)
+    overlay, _ = measure(chessviz, image, overlay=True)
+    print(f"{markers} markers per frame, {len(os.sched_getaffinity(0))} cores")
+    print(f"{'mode':>10} {'fps':>8}")
+    print(f"{'headless':>10} {headless:>8.1f}")
+    print(f"{'overlay':>10} {overlay:>8.1f}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        video = os.path.join(directory, "board.avi")
+        write_video(video, image)
+        for detectors in (1, 2, 4):
+            fps = measure_pipeline(video, detectors)
+            print(f"{f'{detectors} proc':>10} {fps:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmark of vision move inference: the old loop that pushes every legal move
+and compares FEN strings against the occupancy-diff MoveIndex.
+
+Run from the src directory: python benchmarks/bench_move_index.py
+"""
+
+import os
+import sys
+import timeit
+import chess
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from vision.move_index import MoveIndex
+
+# Positions with many legal moves, including castling, en passant and promotion
+POSITIONS = {
+    "kiwipete": "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+    "promotions": "n1n5/PPPk4/8/8/8/8/4Kppp/5N1N w - - 0 1",
+    "en passant": "rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 3",
+    "218 moves": "R6R/3Q4/1Q4Q1/4Q3/2Q4Q/Q4Q2/pp1Q4/kBNN1KB1 w - - 0 1",
+}
+
+
+def board_array(board):
+    chess_array = np.full((8, 8), ".", dtype="U1")
+    for square, piece in board.piece_map().items():
+        chess_array[square // 8, square % 8] = piece.symbol()
+    return chess_array
+
+
+def convert_to_cfen(chess_array):
+    rows = []
+    for i in range(7, -1, -1):
+        row = ""
+        empty_count = 0
+        for j in range(8):
+            piece = chess_array[i][j]
+            if piece == ".":
+                empty_count += 1
+            else:
+                if empty_count > 0:
+                    row += str(empty_count)
+                    empty_count = 0
+                row += piece
+        if empty_count > 0:
+            row += str(empty_count)
+        rows.append(row)
+    return "/".join(rows)
+
+
+def fen_loop(board, chess_array):
+    """
+    The inference update_board_with_vision used before the index
+    """
+    new_fen = convert_to_cfen(chess_array)
+    for move in board.legal_moves:
+        board.push(move)
+        if new_fen == board.fen().split(" ")[0]:
+            board.pop()
+            return move
+        board.pop()
+    return None
+
+
+def main():
+    print(
+        f"{'position':>12} {'moves':>6} {'fen loop (ms)':>14} "
+        f"{'build (ms)':>11} {'match (ms)':>11}"
+    )
+    for name, fen in POSITIONS.items():
+        board = chess.Board(fen)
+        moves = list(board.legal_moves)
+        # worst case for the loop: the last legal move was played
+        board.push(moves[-1])
+        chess_array = board_array(board)
+        board.pop()
+        index = MoveIndex(board)
+        assert fen_loop(board, chess_array) == index.match(chess_array) == moves[-1]
+
+        number = 50
+        loop = min(timeit.repeat(lambda: fen_loop(board, chess_array), number=number, repeat=3))
+        build = min(timeit.repeat(lambda: MoveIndex(board), number=number, repeat=3))
+        match = min(timeit.repeat(lambda: index.match(chess_array), number=number, repeat=3))
+        print(
+            f"{name:>12} {len(moves):>6} {loop / number * 1000:>14.3f} "
+            f"{build / number * 1000:>11.3f} {match / number * 1000:>11.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
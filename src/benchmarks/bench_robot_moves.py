@@ -0,0 +1,101 @@
+"""
+Replays recorded games through the move planner and executor on the
+simulated robot and reports simulated seconds per move and per phase.
+
+Run from the src directory: python benchmarks/bench_robot_moves.py
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import sys
+import chess
+import chess.pgn
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["ROBOT_BACKEND"] = "sim"  # must be set before robot_api is imported
+from robot_api import api
+from robot_api.planner import plan_move
+from robot_api.graveyard import Graveyard
+from robot_api.timing import TIMINGS
+
+GAMES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "games", "recorded.pgn")
+
+
+def play_move(board, move, graveyard):
+    """
+    Execute one move the way ChessGame.handle_stockfish_move does
+    """
+    plan = plan_move(board, move, api.POSES, graveyard=graveyard)
+    api.execute_plan(plan)
+    graveyard.apply(plan)
+
+
+def replay(path):
+    samples = []  # (kind, simulated seconds)
+    with open(path, encoding="utf-8") as pgn:
+        while True:
+            game = chess.pgn.read_game(pgn)
+            if game is None:
+                break
+            board = game.board()
+            graveyard = Graveyard(api.POSES, api.GRAVEYARD_SLOTS)
+            for move in game.mainline_moves():
+                if board.is_castling(move):
+                    kind = "castling"
+                elif move.promotion:
+                    kind = "promotion"
+                elif board.is_en_passant(move):
+                    kind = "en passant"
+                elif board.is_capture(move):
+                    kind = "capture"
+                else:
+                    kind = "quiet"
+                start = api.monotonic()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    play_move(board, move, graveyard)
+                samples.append((kind, api.monotonic() - start))
+                board.push(move)
+    return samples
+
+
+def summarize(samples):
+    summary = {}
+    for kind in ("all", "quiet", "capture", "castling", "en passant", "promotion"):
+        times = [t for k, t in samples if kind in ("all", k)]
+        if times:
+            summary[kind] = {
+                "moves": len(times),
+                "mean": statistics.mean(times),
+                "median": statistics.median(times),
+                "max": max(times),
+            }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--games", default=GAMES, help="PGN file to replay")
+    parser.add_argument("--output", help="also write the summary to this JSON file")
+    args = parser.parse_args()
+
+    summary = summarize(replay(args.games))
+    print(f"{'moves':>10} {'count':>6} {'mean (s)':>9} {'median (s)':>11} {'max (s)':>8}")
+    for kind, stats in summary.items():
+        print(
+            f"{kind:>10} {stats['moves']:>6} {stats['mean']:>9.2f} "
+            f"{stats['median']:>11.2f} {stats['max']:>8.2f}"
+        )
+    print()
+    TIMINGS.report()
+    summary["phases"] = TIMINGS.to_json()
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Frames needed to read the board with fixed and adaptive sampling, on
+simulated frames with increasing marker miss and misread rates.
+
+Run from the src directory: python benchmarks/bench_sampling.py
+"""
+
+import os
+import sys
+import numpy as np
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from vision.voting import EMPTY, PIECE_CODES, add_votes, vote_margins, vote_result
+
+NOISE = ((0.0, 0.0), (0.1, 0.01), (0.2, 0.05), (0.4, 0.1))  # (missed, misread)
+TRIALS = 200
+
+
+def frame(board, missed, misread, rng):
+    sample = board.copy()
+    occupied = board != EMPTY
+    sample[occupied & (rng.random(board.shape) < missed)] = EMPTY
+    wrong = occupied & (rng.random(board.shape) < misread)
+    sample[wrong] = rng.integers(0, PIECE_CODES, size=int(wrong.sum()))
+    return sample
+
+
+def read_board(board, stop, missed, misread, rng):
+    counts = np.zeros((8, 8, PIECE_CODES + 1), dtype=np.int16)
+    frames = 0
+    while not (frames and stop(counts, frames)):
+        add_votes(counts, frame(board, missed, misread, rng))
+        frames += 1
+    codes, _ = vote_result(counts)
+    return frames, bool((codes == board).all())
+
+
+def main():
+    with open("config.yaml", "r", encoding="utf-8") as config_file:
+        vision = yaml.safe_load(config_file)["vision"]
+    sample_size = vision["sample_size"]
+    margin = vision["sampling"]["vote_margin"]
+    max_frames = vision["sampling"]["max_frames"]
+    modes = {
+        "fixed": lambda counts, frames: frames >= sample_size,
+        "adaptive": lambda counts, frames: frames >= max_frames
+        or vote_margins(counts).min() >= margin,
+    }
+
+    rng = np.random.default_rng(0)
+    board = np.full((8, 8), EMPTY, dtype=np.int8)
+    board[:2] = rng.integers(0, PIECE_CODES, size=(2, 8))
+    board[6:] = rng.integers(0, PIECE_CODES, size=(2, 8))
+
+    print(f"{'missed':>7} {'misread':>8} {'mode':>9} {'frames':>7} {'max':>4} {'correct':>8}")
+    for missed, misread in NOISE:
+        for mode, stop in modes.items():
+            results = [read_board(board, stop, missed, misread, rng) for _ in range(TRIALS)]
+            frames = [frames for frames, _ in results]
+            correct = sum(ok for _, ok in results) / TRIALS
+            print(
+                f"{missed:>7.0%} {misread:>8.0%} {mode:>9} {np.mean(frames):>7.1f} "
+                f"{max(frames):>4} {correct:>8.0%}"
+            )
+
+
+if __name__ == "__main__":
+    main()
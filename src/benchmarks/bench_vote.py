@@ -0,0 +1,96 @@
+"""
+Micro-benchmark of the vision vote step: the old per-square Counter loop over
+a "U1" string array against the running int8 vote counts that
+chess_array_update_thread keeps (add_votes per frame, then vote_result).
+
+Run from the src directory: python benchmarks/bench_vote.py
+"""
+
+import os
+import sys
+import timeit
+from collections import Counter
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from vision.voting import EMPTY, PIECE_CODES, add_votes, decode, vote_result
+
+CHESS_DICT = {
+    0: "p",
+    1: "B",
+    2: "N",
+    3: "k",
+    4: "Q",
+    5: "P",
+    6: "b",
+    7: "r",
+    8: "K",
+    9: "q",
+    10: "n",
+    11: "R",
+}
+SAMPLE_SIZES = (20, 100, 500)
+
+
+def counter_vote(chess_arrays):
+    """
+    The aggregation chess_array_update_thread used before vectorization
+    """
+    final_chess_array = np.full((8, 8), ".", dtype="U1")
+    for i in range(8):
+        for j in range(8):
+            pieces_at_position = [
+                board[i, j] for board in chess_arrays if board[i, j] != "."
+            ]
+            if pieces_at_position:
+                most_common_piece = Counter(pieces_at_position).most_common(1)[0][0]
+                final_chess_array[i, j] = most_common_piece
+    return final_chess_array
+
+
+def noisy_samples(sample_size, rng):
+    """
+    Samples of a starting position with missed and misread markers
+    """
+    board = np.full((8, 8), EMPTY, dtype=np.int8)
+    board[:2] = rng.integers(0, PIECE_CODES, size=(2, 8))
+    board[6:] = rng.integers(0, PIECE_CODES, size=(2, 8))
+    samples = np.repeat(board[np.newaxis], sample_size, axis=0)
+    missed = rng.random(samples.shape) < 0.2
+    misread = rng.random(samples.shape) < 0.05
+    samples[missed] = EMPTY
+    samples[misread] = rng.integers(0, PIECE_CODES, size=int(misread.sum()))
+    return samples
+
+
+def running_vote(samples):
+    """
+    The aggregation chess_array_update_thread does now, frame by frame
+    """
+    counts = np.zeros((8, 8, PIECE_CODES + 1), dtype=np.int16)
+    for sample in samples:
+        add_votes(counts, sample)
+    codes, _ = vote_result(counts)
+    return decode(codes, CHESS_DICT)
+
+
+def main():
+    rng = np.random.default_rng(0)
+    print(f"{'samples':>8} {'counter (ms)':>14} {'running (ms)':>13} {'speedup':>8}")
+    for sample_size in SAMPLE_SIZES:
+        codes = noisy_samples(sample_size, rng)
+        # Counter breaks ties by the first marker seen and the vote counts by
+        # the lowest code; frames sorted per square make both agree on ties
+        strings = decode(np.sort(codes, axis=0), CHESS_DICT)
+        assert np.array_equal(counter_vote(strings), running_vote(codes))
+
+        number = max(1, 2000 // sample_size)
+        old = min(timeit.repeat(lambda: counter_vote(strings), number=number, repeat=3))
+        new = min(timeit.repeat(lambda: running_vote(codes), number=number, repeat=3))
+        old_ms = old / number * 1000
+        new_ms = new / number * 1000
+        print(f"{sample_size:>8} {old_ms:>14.3f} {new_ms:>13.3f} {old_ms / new_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,44 +1,77 @@
-from time import sleep
+"""
+Move button over HID.
+
+The reader thread keeps the device open for the whole game and does
+blocking reads with a timeout, so it sleeps in the driver while nobody
+presses the button. A press is posted to the input event queue (see
+input_events). A lost device is reopened with exponential backoff.
+"""
+
+import threading
 import hid
 from colorama import Fore
 
-gamepad = hid.device()
 
-global connectionStatus
-connectionStatus = False
+class ButtonReader(threading.Thread):
+    def __init__(
+        self,
+        events,
+        vendor_id=0x2E8A,
+        product_id=0x010A,
+        read_timeout=0.5,
+        backoff=0.5,
+        max_backoff=8.0,
+    ):
+        super().__init__(daemon=True, name="button")
+        self.events = events
+        self.vendor_id = vendor_id
+        self.product_id = product_id
+        self.read_timeout_ms = int(read_timeout * 1000)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.gamepad = hid.device()
+        self.connected = False
+        self.stopped = threading.Event()
 
+    def connect(self):
+        """
+        Open the button, waiting longer after every failed attempt
+        """
+        delay = self.backoff
+        while not self.stopped.is_set():
+            try:
+                self.gamepad.open(self.vendor_id, self.product_id)
+                self.connected = True
+                print(Fore.GREEN + "Connected to button")
+                return
+            except IOError:
+                print(Fore.RED + f"Could not connect to button, retrying in {delay:g}s")
+                self.stopped.wait(delay)
+                delay = min(delay * 2, self.max_backoff)
 
-def connectToButton():
-    gamepad.close()
-    try:
-        gamepad.open(0x2E8A, 0x010A)
-        print(Fore.GREEN + "Connected to button")
-        global connectionStatus
-        connectionStatus = True
-    except IOError:
-        print(Fore.RED + "Could not connect to button")
-
-def listenForButton():
-    gamepad.set_nonblocking(True)
-    previous_state = 0
-    while True:
-        try:
-            report = gamepad.read(64)
+    def run(self):
+        previous_state = 0
+        while not self.stopped.is_set():
+            if not self.connected:
+                self.connect()
+                previous_state = 0
+                continue
+            try:
+                report = self.gamepad.read(64, self.read_timeout_ms)
+            except (IOError, ValueError):
+                print(Fore.YELLOW + "Error reading from button, reconnecting")
+                self.gamepad.close()
+                self.connected = False
+                continue
             if report:
                 pressed = report[8:-3]
                 if pressed[0] == 1 and previous_state == 0:
                     print(Fore.BLUE + "Button pressed!")
-                    break
+                    self.events.post("button")
                 previous_state = pressed[0]
-        except IOError:
-            print(Fore.YELLOW + "Error reading from button")
-            connectionStatus = False
-            gamepad.close()
-            while connectionStatus is False:
-                try:
-                    print(Fore.YELLOW + "Reconnecting to button")
-                    connectToButton()
-                    sleep(1)
-                except IOError:
-                    print(Fore.RED + "Could not reconnect to button")
-                    sleep(1)
+        if self.connected:
+            self.gamepad.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.join(timeout=2 * self.read_timeout_ms / 1000)
@@ -0,0 +1,128 @@
+"""
+On-disk cache of engine moves, so repeated openings don't need a new search.
+
+Entries live in an SQLite file and are keyed by the Zobrist hash of the
+position, the ELO setting and the search budget. Every key can hold a few
+variants: a lookup picks one of the variant slots at random and only hits
+when that slot is filled, so a replayed opening still varies the way a
+strength-limited engine does. The least recently used entries are evicted
+once the cache grows past its size limit.
+"""
+
+import json
+import random
+import sqlite3
+import threading
+import time
+import chess.polyglot
+from colorama import Fore
+
+
+def position_key(board):
+    """
+    Zobrist hash of a position as a signed 64-bit SQLite integer
+    """
+    key = chess.polyglot.zobrist_hash(board)
+    return key - (1 << 64) if key >= 1 << 63 else key
+
+
+def budget_key(budget):
+    """
+    Stable text form of a search budget from config.yaml
+    """
+    return json.dumps(budget, sort_keys=True)
+
+
+class EngineCache:
+    def __init__(self, path, max_entries=100000, variants=1):
+        self.max_entries = max_entries
+        self.variants = variants
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        # Opened on the engine startup thread, used from the game loop
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS moves (
+                position INTEGER NOT NULL,
+                elo INTEGER NOT NULL,
+                budget TEXT NOT NULL,
+                variant INTEGER NOT NULL,
+                move TEXT NOT NULL,
+                score INTEGER,
+                used REAL NOT NULL,
+                PRIMARY KEY (position, elo, budget, variant)
+            );
+            CREATE INDEX IF NOT EXISTS moves_used ON moves (used);
+            """
+        )
+        self.entries = self.db.execute("SELECT COUNT(*) FROM moves").fetchone()[0]
+        self._slot = None  # key of the last miss, filled by store()
+
+    def lookup(self, board, elo, budget):
+        """
+        Cached move for a position as a UCI string, or None on a miss
+        """
+        key = (position_key(board), elo, budget_key(budget), random.randrange(self.variants))
+        with self.lock:
+            row = self.db.execute(
+                "SELECT move FROM moves WHERE position=? AND elo=? AND budget=? AND variant=?",
+                key,
+            ).fetchone()
+            if row is None or chess.Move.from_uci(row[0]) not in board.legal_moves:
+                # A Zobrist collision can't play a move that isn't legal here
+                self.misses += 1
+                self._slot = key
+                return None
+            self.db.execute(
+                "UPDATE moves SET used=? WHERE position=? AND elo=? AND budget=? AND variant=?",
+                (time.time(), *key),
+            )
+            self.db.commit()
+            self.hits += 1
+            self._slot = None
+        return row[0]
+
+    def store(self, board, elo, budget, move, score=None):
+        """
+        Store the move found for a position after a miss
+        """
+        key = self._slot
+        if key is None or key[:3] != (position_key(board), elo, budget_key(budget)):
+            key = (position_key(board), elo, budget_key(budget), random.randrange(self.variants))
+        self._slot = None
+        with self.lock:
+            try:
+                self.db.execute(
+                    "INSERT INTO moves VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (*key, move, score, time.time()),
+                )
+                self.entries += 1
+            except sqlite3.IntegrityError:
+                self.db.execute(
+                    "UPDATE moves SET move=?, score=?, used=? "
+                    "WHERE position=? AND elo=? AND budget=? AND variant=?",
+                    (move, score, time.time(), *key),
+                )
+            if self.entries > self.max_entries:
+                self.db.execute(
+                    "DELETE FROM moves WHERE rowid IN "
+                    "(SELECT rowid FROM moves ORDER BY used LIMIT ?)",
+                    (self.entries - self.max_entries,),
+                )
+                self.entries = self.max_entries
+            self.db.commit()
+
+    def report(self):
+        lookups = self.hits + self.misses
+        hit_rate = self.hits / lookups if lookups else 0.0
+        print(
+            Fore.CYAN
+            + f"Engine cache: {self.hits}/{lookups} hits ({hit_rate:.0%}), "
+            + f"{self.entries} entries"
+        )
+
+    def close(self):
+        with self.lock:
+            self.db.close()
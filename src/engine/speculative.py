@@ -0,0 +1,163 @@
+"""
+Speculative Stockfish replies computed while the human is thinking.
+
+While the game waits for the human's move, a pool of workers searches the
+engine's reply to every legal human move (most likely first) and stores the
+results in a table keyed by the FEN of the position after the human's move.
+When the human's move lands the reply is taken straight from the table.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import chess
+from colorama import Fore
+from engine.uci import EngineSession
+
+PIECE_VALUES = {
+    chess.PAWN: 1,
+    chess.KNIGHT: 3,
+    chess.BISHOP: 3,
+    chess.ROOK: 5,
+    chess.QUEEN: 9,
+    chess.KING: 0,
+}
+
+# Each worker thread owns its own Stockfish session, so the searches run in
+# parallel even though the pool itself is made of threads.
+_worker = threading.local()
+_sessions = []  # every worker session, closed on shutdown
+_sessions_lock = threading.Lock()
+
+
+def _init_worker(stockfish_path, limit, elo_rating, threads, hash_mb):
+    _worker.session = EngineSession(
+        stockfish_path, limit, elo_rating=elo_rating, threads=threads, hash_mb=hash_mb
+    )
+    with _sessions_lock:
+        _sessions.append(_worker.session)
+
+
+def _search_reply(board):
+    """
+    Search the engine's reply in the given position
+    """
+    start = time.perf_counter()
+    best_move = _worker.session.best_move(board)
+    return best_move, time.perf_counter() - start
+
+
+def move_likelihood(board, move):
+    """
+    Cheap guess of how likely the human is to play a move (higher is likelier)
+    """
+    score = 0
+    if board.is_capture(move):
+        if board.is_en_passant(move):
+            victim = chess.PAWN
+        else:
+            victim = board.piece_type_at(move.to_square)
+        attacker = board.piece_type_at(move.from_square)
+        score += 10 * PIECE_VALUES[victim] - PIECE_VALUES[attacker] + 100
+    if move.promotion:
+        score += 90
+    if board.gives_check(move):
+        score += 50
+    if board.is_castling(move):
+        score += 40
+    return score
+
+
+class SpeculativeReplies:
+    def __init__(self, stockfish_path, limit, elo_rating, workers=2, threads=1, hash_mb=16):
+        self.pool = ThreadPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(stockfish_path, limit, elo_rating, threads, hash_mb),
+        )
+        self.table = {}  # FEN after the human's move -> (reply, search seconds)
+        self.pending = {}  # FEN after the human's move -> future
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    def start(self, board):
+        """
+        Queue a reply search for every legal human move, most likely first
+        """
+        self.cancel()
+        self.table.clear()
+        moves = sorted(
+            board.legal_moves,
+            key=lambda move: move_likelihood(board, move),
+            reverse=True,
+        )
+        for move in moves:
+            board.push(move)
+            fen = board.fen()
+            after = board.copy()
+            board.pop()
+            self.pending[fen] = self.pool.submit(_search_reply, after)
+
+    def cancel(self):
+        """
+        Drop every search that has not started yet
+        """
+        for future in self.pending.values():
+            future.cancel()
+        self.pending.clear()
+
+    def _collect(self):
+        for fen, future in list(self.pending.items()):
+            if future.done() and not future.cancelled():
+                if future.exception() is None:
+                    self.table[fen] = future.result()
+                del self.pending[fen]
+
+    def lookup(self, board):
+        """
+        Return the precomputed reply for the current position, or None if the
+        engine has to fall back to a live search
+        """
+        fen = board.fen()
+        self._collect()
+        reply = self.table.get(fen)
+        if reply is None:
+            future = self.pending.pop(fen, None)
+            # A search that is already running is closer to done than a new one
+            if future is not None and not future.cancel():
+                wait_start = time.perf_counter()
+                try:
+                    best_move, search_seconds = future.result()
+                except Exception:
+                    best_move = None
+                if best_move is not None:
+                    waited = time.perf_counter() - wait_start
+                    reply = (best_move, max(search_seconds - waited, 0.0))
+        self.cancel()
+
+        if reply is None or reply[0] is None:
+            self.misses += 1
+            return None
+        best_move, saved = reply
+        self.hits += 1
+        self.saved_seconds += saved
+        print(Fore.GREEN + f"Speculative reply hit, saved {saved:.2f}s")
+        return best_move
+
+    def report(self):
+        lookups = self.hits + self.misses
+        hit_rate = self.hits / lookups if lookups else 0.0
+        print(
+            Fore.CYAN
+            + f"Speculative replies: {self.hits}/{lookups} hits ({hit_rate:.0%}), "
+            + f"{self.saved_seconds:.2f}s engine latency saved"
+        )
+
+    def shutdown(self):
+        self.cancel()
+        self.pool.shutdown(wait=True, cancel_futures=True)
+        with _sessions_lock:
+            for session in _sessions:
+                session.close()
+            _sessions.clear()
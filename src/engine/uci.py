@@ -0,0 +1,93 @@
+"""
+Persistent UCI session with Stockfish through python-chess.
+
+One engine process stays open for the whole game. Positions are sent as the
+start position plus the move list of the board, under one game key, so the
+engine keeps its hash table between moves instead of starting every search
+from a fresh FEN. Searches are bounded by a time or node budget from
+config.yaml rather than a fixed depth, so the thinking time per difficulty
+level is predictable.
+"""
+
+import chess
+import chess.engine
+from colorama import Fore
+
+MATE_SCORE = 100000  # centipawns a forced mate is scored as
+
+
+def search_limit(budget):
+    """
+    chess.engine.Limit from a budget in config.yaml, e.g. {time: 0.5},
+    {nodes: 200000} or {depth: 8}
+    """
+    unknown = set(budget) - {"time", "nodes", "depth"}
+    if unknown or not budget:
+        raise ValueError(f"Engine budget must set time, nodes or depth, got {budget}")
+    return chess.engine.Limit(
+        time=budget.get("time"),
+        nodes=budget.get("nodes"),
+        depth=budget.get("depth"),
+    )
+
+
+class EngineSession:
+    def __init__(self, path, limit, elo_rating=None, threads=1, hash_mb=16):
+        self.limit = limit
+        self.engine = chess.engine.SimpleEngine.popen_uci(path)
+        self.clamped = set()  # option values already warned about
+        options = {"Threads": threads, "Hash": hash_mb}
+        self.elo_rating = None
+        if elo_rating is not None:
+            self.elo_rating = self._clamp("UCI_Elo", elo_rating)
+            options["UCI_LimitStrength"] = True
+            options["UCI_Elo"] = self.elo_rating
+        self.engine.configure(options)
+        self.game = object()  # the engine keeps its hash while the key stays the same
+
+    def _clamp(self, name, value):
+        option = self.engine.options.get(name)
+        if option is None or option.min is None:
+            return value
+        clamped = min(max(value, option.min), option.max)
+        if clamped != value and (name, value) not in self.clamped:
+            self.clamped.add((name, value))
+            print(Fore.YELLOW + f"{name} {value} is outside {option.min}-{option.max}, using {clamped}")
+        return clamped
+
+    def search(self, board, limit=None, elo_rating=None):
+        """
+        Engine's move in the given position as a UCI string and its score in
+        centipawns from white's side (None if unknown), or (None, None) if
+        there is no legal move. limit and elo_rating override the session's
+        settings for this search only.
+        """
+        options = {}
+        if elo_rating is not None:
+            options = {"UCI_LimitStrength": True, "UCI_Elo": self._clamp("UCI_Elo", elo_rating)}
+        result = self.engine.play(
+            board,
+            limit or self.limit,
+            game=self.game,
+            info=chess.engine.INFO_SCORE,
+            options=options,
+        )
+        if result.move is None:
+            return None, None
+        score = result.info.get("score")
+        if score is not None:
+            score = score.white().score(mate_score=MATE_SCORE)
+        return result.move.uci(), score
+
+    def best_move(self, board):
+        """
+        Engine's move in the given position as a UCI string, or None if there
+        is no legal move
+        """
+        return self.search(board)[0]
+
+    def new_game(self):
+        self.game = object()
+
+    def close(self):
+        self.engine.quit()
@@ -0,0 +1,97 @@
+"""
+One queue for every way a human talks to the game.
+
+Button presses (button_input), lines typed on the keyboard and vision
+"board changed" readings arrive as InputEvents on a single queue that
+ChessGame.run blocks on, instead of each source spinning in its own loop.
+"""
+
+import queue
+import sys
+import threading
+import time
+from collections import namedtuple
+
+# source is "button", "keyboard" or "vision"; value is the typed line for
+# the keyboard and (chess_array, confidence) for vision
+InputEvent = namedtuple("InputEvent", ["source", "value", "time"])
+
+
+class InputEvents:
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.button = None
+        self.keyboard = None
+
+    def post(self, source, value=None):
+        self.queue.put(InputEvent(source, value, time.monotonic()))
+
+    def start_keyboard(self):
+        """
+        Read lines from stdin on a thread. After this, every keyboard answer
+        must come through ask() instead of input().
+        """
+        if self.keyboard is None:
+            self.keyboard = threading.Thread(
+                target=self._read_keyboard, daemon=True, name="keyboard"
+            )
+            self.keyboard.start()
+
+    def _read_keyboard(self):
+        for line in sys.stdin:
+            self.post("keyboard", line.rstrip("\n"))
+        self.post("keyboard", None)  # end of input
+
+    def start_button(self, settings):
+        from button_input import ButtonReader  # hid is only needed with the button
+
+        if self.button is None:
+            self.button = ButtonReader(self, **settings)
+            self.button.start()
+
+    def clear(self):
+        """
+        Drop events from before now, e.g. presses while the robot moved.
+        The end of keyboard input is kept.
+        """
+        closed = None
+        while True:
+            try:
+                event = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if event.source == "keyboard" and event.value is None:
+                closed = event
+        if closed:
+            self.queue.put(closed)
+
+    def wait(self, sources=None, timeout=None):
+        """
+        Next event from one of the sources (all if None), or None on timeout.
+        Events from other sources are dropped.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                event = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                return None
+            if sources is None or event.source in sources:
+                return event
+
+    def ask(self, prompt):
+        """
+        Print a prompt and return the next typed line, like input()
+        """
+        self.start_keyboard()
+        print(prompt, end="", flush=True)
+        event = self.wait(("keyboard",))
+        if event.value is None:
+            self.queue.put(event)  # keep the end of input for later asks
+            raise EOFError("stdin closed")
+        return event.value
+
+    def close(self):
+        if self.button:
+            self.button.stop()
@@ -2,105 +2,232 @@
 This script controls a UR10 robot to play chess against the Stockfish chess engine.
 """
 
-import platform
-import subprocess
+import argparse
+import shutil
 import random
-import json
+import time
 import chess
 import chess.svg
 import chess.engine
-from stockfish import Stockfish
-from stockfish import StockfishException
 from colorama import Fore
 import threading
-from button_input import connectToButton, listenForButton
+from input_events import InputEvents
 import yaml
+from engine.speculative import SpeculativeReplies
+from engine.uci import EngineSession, search_limit
+from engine.cache import EngineCache
+from startup import StartupTimeline
 from robot_api.api import (
+    GRAVEYARD_SLOTS,
+    POSES,
+    connect_to_robot,
     move_to_square,
     disconnect_from_robot,
-    direct_move_piece,
-    remove_piece,
+    execute_plan,
+    start_telemetry,
+    stop_telemetry,
 )
+from robot_api.planner import plan_move
+from robot_api.graveyard import Graveyard
+from robot_api.timing import TIMINGS
 
 class ChessGame:
-    def __init__(self, config_path="config.yaml"):
+    def __init__(self, config_path="config.yaml", options=None):
         self.config = self.load_config(config_path)
+        self.options = options or {}  # startup options from the command line
+        self.interactive = self.options.get("interactive")
+        if self.interactive is None:
+            self.interactive = self.config["startup"]["interactive"]
         self.piece_heights = self.config["piece_heights"]
         self.stockfish_difficulty = self.config["stockfish_difficulty_level"]
-        self.stockfish_path = self.get_stockfish_path()
+        self.engine_config = self.config["engine"]
+        self.timing_config = self.config["timing"]
+        self.cache_config = self.config["engine_cache"]
+        self.timeline = StartupTimeline()
+
+        # Settle every startup question first, so the slow resources below
+        # can start together instead of one after the other
         self.zero_player_mode = self.get_zero_player_mode()
+        self.last_game_loaded = False
         self.board = self.initialize_board()
-        self.stockfish = self.initialize_stockfish()
-        self.chess_vision_mode = False
-        self.chessviz = None
-        self.lock = None
-        self.setup_vision()
+        self.graveyard = self.initialize_graveyard()
+        self.difficulty = None if self.zero_player_mode else self.get_difficulty()
+        self.chess_vision_mode = self.get_chess_vision_mode()
+        self.stockfish_path = None
+        self.elo_rating = None
+        self.search_budget = None
+        self.search_limit = None
+        self.lock = threading.Lock() if self.chess_vision_mode else None
+        self.move_index = None
+        self.inputs = InputEvents()  # button, keyboard and vision events of the human player
+
+        # Resources start concurrently and are waited for on first use
+        self._engine = self.timeline.launch("engine", self.initialize_engine)
+        self.timeline.launch("robot", connect_to_robot)
+        if self.config["telemetry"]["enabled"]:
+            self.timeline.launch("telemetry", start_telemetry)
+        self._vision = None
+        if self.chess_vision_mode:
+            self._vision = self.timeline.launch("vision", self.setup_vision)
+        self.timeline.seal()
+
+    @property
+    def stockfish(self):
+        return self._engine.result()[0]
+
+    @property
+    def speculator(self):
+        return self._engine.result()[1]
+
+    @property
+    def cache(self):
+        return self._engine.result()[2]
+
+    @property
+    def chessviz(self):
+        return self._vision.result() if self._vision else None
+
+    def startup_option(self, name):
+        """
+        Startup option from the command line, or from config.yaml when not
+        interactive. None means the user has to be asked.
+        """
+        value = self.options.get(name)
+        if value is None and not self.interactive:
+            value = self.config["startup"][name]
+        return value
 
     def load_config(self, config_path):
         with open(config_path, "r") as config_file:
             return yaml.safe_load(config_file)
 
     def get_stockfish_path(self):
-        os_system = platform.system()
-        command = "which" if os_system in ("Darwin", "Linux") else "where"
-        try:
-            result = subprocess.run([command, "stockfish"], capture_output=True, text=True, check=True)
-            return result.stdout.strip("\n")
-        except subprocess.CalledProcessError:
+        path = shutil.which("stockfish")
+        if path is None:
             raise Exception("No binary or executable found for stockfish")
+        return path
 
     def initialize_board(self):
-        start_new_game = input(Fore.YELLOW + "Continue last game? (Y/n): ")
-        if start_new_game.lower() != "y":
+        continue_last_game = self.startup_option("continue_last_game")
+        if continue_last_game is None:
+            start_new_game = input(Fore.YELLOW + "Continue last game? (Y/n): ")
+            continue_last_game = start_new_game.lower() == "y"
+        if not continue_last_game:
             print(Fore.GREEN + "New game started!")
             return chess.Board()
         try:
             with open("lastgame.txt", "r", encoding="utf-8") as file:
                 lastgame = file.read()
                 print(Fore.GREEN + "Last game loaded!")
+                self.last_game_loaded = True
                 return chess.Board(lastgame)
         except FileNotFoundError:
             print(Fore.RED + "No last game found, starting new game!")
             return chess.Board()
 
+    def initialize_graveyard(self):
+        if self.last_game_loaded:
+            try:
+                return Graveyard.load("lastgame_graveyard.json", POSES, GRAVEYARD_SLOTS)
+            except (FileNotFoundError, ValueError):
+                print(Fore.RED + "No matching graveyard found, starting with an empty graveyard!")
+        return Graveyard(POSES, GRAVEYARD_SLOTS)
+
+    def get_difficulty(self):
+        difficulty = self.startup_option("difficulty")
+        if difficulty is None:
+            difficulty = input("Enter difficulty (easy, medium, expert, gm): ") or "easy"
+        if difficulty not in self.stockfish_difficulty:
+            print(Fore.RED + "Invalid difficulty level")
+            exit()
+        return difficulty
+
+    def initialize_engine(self):
+        self.stockfish_path = self.get_stockfish_path()
+        stockfish = self.initialize_stockfish()
+        return stockfish, self.initialize_speculator(), self.initialize_cache()
+
     def initialize_stockfish(self):
-        stockfish = Stockfish(path=self.stockfish_path)
-        stockfish.set_depth(8)
+        budgets = self.engine_config["budget"]
         if self.zero_player_mode:
-            random_number = random.randint(2000, 3000)
-            stockfish.set_elo_rating(random_number)
+            # A random ELO on a grid, so the engine cache still gets hits
+            elo_rating = random.randrange(2000, 3001, self.cache_config["elo_step"])
+            self.search_budget = budgets["zero_player"]
         else:
-            difficulty = input("Enter difficulty (easy, medium, expert, gm): ") or "easy"
-            try:
-                elo_rating = self.stockfish_difficulty[difficulty]
-                stockfish.set_elo_rating(elo_rating)
-                print(Fore.GREEN + f"Difficulty set to {difficulty} (ELO {elo_rating})")
-            except KeyError:
-                print(Fore.RED + "Invalid difficulty level")
-                exit()
+            elo_rating = self.stockfish_difficulty[self.difficulty]
+            self.search_budget = budgets[self.difficulty]
+        self.search_limit = search_limit(self.search_budget)
+        stockfish = EngineSession(
+            self.stockfish_path,
+            self.search_limit,
+            elo_rating=elo_rating,
+            threads=self.engine_config["threads"],
+            hash_mb=self.engine_config["hash"],
+        )
+        self.elo_rating = stockfish.elo_rating
+        if not self.zero_player_mode:
+            print(Fore.GREEN + f"Difficulty set to {self.difficulty} (ELO {self.elo_rating})")
         return stockfish
 
+    def initialize_speculator(self):
+        # Speculation only pays off while a human is thinking
+        if self.zero_player_mode or not self.engine_config["speculative_replies"]:
+            return None
+        return SpeculativeReplies(
+            self.stockfish_path,
+            self.search_limit,
+            self.elo_rating,
+            workers=self.engine_config["speculative_workers"],
+            threads=self.engine_config["threads"],
+            hash_mb=self.engine_config["hash"],
+        )
+
+    def initialize_cache(self):
+        if not self.cache_config["enabled"]:
+            return None
+        return EngineCache(
+            self.cache_config["path"],
+            max_entries=self.cache_config["max_entries"],
+            variants=self.cache_config["variants"],
+        )
+
     def get_zero_player_mode(self):
-        zero_player_mode = input(Fore.LIGHTGREEN_EX + "Zero player mode? (y/N): ")
-        return zero_player_mode.lower() == "y"
+        zero_player_mode = self.startup_option("zero_player_mode")
+        if zero_player_mode is None:
+            zero_player_mode = input(Fore.LIGHTGREEN_EX + "Zero player mode? (y/N): ")
+            zero_player_mode = zero_player_mode.lower() == "y"
+        return zero_player_mode
+
+    def get_chess_vision_mode(self):
+        chess_vision_mode = self.startup_option("chess_vision")
+        if chess_vision_mode is None:
+            chess_vision_mode = input(Fore.LIGHTMAGENTA_EX + "Use chess vision? (y/N): ")
+            chess_vision_mode = chess_vision_mode.lower() == "y"
+        return chess_vision_mode
 
     def setup_vision(self):
-        chess_vision_mode = input(Fore.LIGHTMAGENTA_EX + "Use chess vision? (y/N): ")
-        self.chess_vision_mode = chess_vision_mode.lower() == "y"
-        if self.chess_vision_mode:
-            from vision.chessviz import ChessViz  # Import only when needed
-            vision_config = self.config["vision"]
-            self.chessviz = ChessViz(
-                vision_config["board_corners"][0],
-                vision_config["board_corners"][1],
-                cam_index=vision_config["cam_index"],
-            )
-            self.lock = threading.Lock()
-            sample_size = self.config["vision"]["sample_size"]
-            vision_thread = threading.Thread(
-                target=self.chessviz.chess_array_update_thread, args=(sample_size,)
-            )
-            vision_thread.start()
+        from vision.chessviz import ChessViz  # Import only when needed
+        vision_config = self.config["vision"]
+        chessviz = ChessViz(
+            vision_config["board_corners"][0],
+            vision_config["board_corners"][1],
+            cam_index=vision_config["cam_index"],
+            camera_settings=vision_config["camera"],
+            sampling=vision_config["sampling"],
+            pipeline=vision_config["pipeline"],
+            board_outline=vision_config["board_outline"],
+            localizer=vision_config["localizer"],
+            auto_detect=vision_config["auto_detect"],
+            events=self.inputs,
+        )
+        sample_size = self.config["vision"]["sample_size"]
+        vision_thread = threading.Thread(
+            target=chessviz.chess_array_update_thread, args=(sample_size,)
+        )
+        vision_thread.start()
+        if vision_config["overlay"]:
+            chessviz.start_overlay(vision_config["overlay_fps"])
+        return chessviz
 
     def display_board(self):
         with open("chess.svg", "w", encoding="utf-8") as file_obj:
@@ -109,6 +236,7 @@ class ChessGame:
     def save_last_play(self):
         with open("lastgame.txt", "w", encoding="utf-8") as file_obj:
             file_obj.write(self.board.fen())
+        self.graveyard.save("lastgame_graveyard.json")
 
     def process_move(self, move_str):
         try:
@@ -123,58 +251,81 @@ class ChessGame:
             print(Fore.RED + "Invalid move format.")
             return False
 
+    def engine_move(self):
+        """
+        Engine's move in the current position, from the cache, the speculative
+        replies or a live search, in that order
+        """
+        if self.cache:
+            best_move = self.cache.lookup(self.board, self.elo_rating, self.search_budget)
+            if best_move is not None:
+                if self.speculator:
+                    self.speculator.cancel()
+                print(Fore.GREEN + "Engine cache hit")
+                return best_move
+        best_move, score = None, None
+        if self.speculator:
+            best_move = self.speculator.lookup(self.board)
+        if best_move is None:
+            best_move, score = self.stockfish.search(self.board)
+        if self.cache:
+            self.cache.store(self.board, self.elo_rating, self.search_budget, best_move, score)
+        return best_move
+
     def handle_stockfish_move(self):
-        self.stockfish.set_fen_position(self.board.fen())
-        best_move = self.stockfish.get_top_moves(1)[0]["Move"]
+        TIMINGS.move = len(self.board.move_stack)
+        with TIMINGS.measure("engine_think"):
+            best_move = self.engine_move()
         uci_format_best_move = chess.Move.from_uci(best_move)
         target_square = uci_format_best_move.to_square
-        origin_square = uci_format_best_move.from_square
-
-        move = best_move
-        move_pos = Move(self.piece_heights, self.board, data, move)
         if self.board.piece_at(target_square):
             print(Fore.CYAN + f"Space occupied by {self.board.piece_at(target_square)}, removing...")
-            move_pos.main_remove_piece()
 
-        move_pos.main_direct_move_piece()
-        self.board.push_san(best_move)
+        # One ordered pick/place plan covers captures, castling, en passant and promotion
+        plan = plan_move(self.board, uci_format_best_move, POSES, graveyard=self.graveyard)
+        execute_plan(plan)
+        self.graveyard.apply(plan)
+        self.board.push(uci_format_best_move)
         print(Fore.GREEN + f"Stockfish moves: {best_move}")
 
-    def update_board_with_vision(self, chess_array):
-        new_fen = self.convert_to_cfen(chess_array)
-        for move in self.board.legal_moves:
-            self.board.push(move)
-            if new_fen == self.board.fen().split(" ")[0]:
-                return True
-            self.board.pop()
-        return False
-
-    def convert_to_cfen(self, chess_array):  # same as before
-        rows = []
-        for i in range(7, -1, -1):
-            row = ""
-            empty_count = 0
-            for j in range(8):
-                piece = chess_array[i][j]
-                if piece == ".":
-                    empty_count += 1
-                else:
-                    if empty_count > 0:
-                        row += str(empty_count)
-                        empty_count = 0
-                    row += piece
+    def save_timings(self, start):
+        path = self.timing_config["path"].format(start=time.strftime("%Y%m%d-%H%M%S", start))
+        TIMINGS.report()
+        TIMINGS.dump(path)
+        print(Fore.CYAN + f"Move timings written to {path}")
 
-            if empty_count > 0:
-                row += str(empty_count)
-            rows.append(row)
+    def vision_index(self):
+        from vision.move_index import MoveIndex  # Import only when needed
+        # Build the index once per position, retries reuse it
+        if self.move_index is None or self.move_index.fen != self.board.fen():
+            self.move_index = MoveIndex(self.board)
+        return self.move_index
 
-        cfen = "/".join(rows)
-        return cfen
+    def update_board_with_vision(self, chess_array):
+        move = self.vision_index().match(chess_array)
+        if move is None:
+            return False
+        self.board.push(move)
+        return True
+
+    def print_unsure_squares(self, confidence):
+        # Vision arrays have rank 1 in row 0, so the flat index is the square
+        threshold = self.config["vision"]["sampling"]["unsure_below"]
+        unsure = [
+            chess.square_name(square)
+            for square, value in enumerate(confidence.flat)
+            if value < threshold
+        ]
+        if unsure:
+            print(Fore.YELLOW + f"Vision is unsure about {', '.join(unsure)}")
 
     def run(self):
-        with open("setup.json", encoding="utf-8") as f: # Only open once
-            global data # make data available to Move class
-            data = json.load(f)
+        start = time.localtime()
+        TIMINGS.reset()
+        if not self.zero_player_mode:
+            if self.chess_vision_mode:
+                self.inputs.start_button(self.config["button"])
+            self.inputs.start_keyboard()
         while not self.board.is_game_over():
             self.display_board()
             self.save_last_play()
@@ -183,6 +334,8 @@ class ChessGame:
             else:
                 if self.board.turn == chess.WHITE:
                     print(Fore.WHITE + "White to move")
+                    if self.speculator:
+                        self.speculator.start(self.board)
                     move_to_square()
                     print(Fore.CYAN + "Moving to bin position...")
                     print(Fore.WHITE + "Legal moves:")
@@ -197,27 +350,41 @@ class ChessGame:
                         print(Fore.LIGHTRED_EX + move_type + move.uci(), end=" ")
 
                     if self.chess_vision_mode:
+                        print("\n", "Press enter key to register move.")
+                        self.inputs.clear()  # presses from before the prompt
                         while True:
-                            print("\n", "Press enter key to register move.")
-                            connectToButton()
-                            listenForButton()
-
-                            self.chessviz.counter_on.clear()
-                            self.chessviz.counter_on.wait()
+                            event = self.inputs.wait()
+                            if event.source == "keyboard" and event.value is None:
+                                continue  # stdin closed, only the button is left
+
+                            if event.source == "vision":
+                                chess_array, confidence = event.value
+                                if self.vision_index().unchanged(chess_array):
+                                    continue  # settled after the robot's move, nothing new
+                            else:
+                                self.chessviz.counter_on.clear()
+                                self.chessviz.counter_on.wait()
 
-                            with self.lock:
-                                chess_array = self.chessviz.chess_array
-                                print(chess_array)
+                                with self.lock:
+                                    chess_array = self.chessviz.chess_array
+                                    confidence = self.chessviz.chess_confidence
+                            print(chess_array)
 
                             valid_input = self.update_board_with_vision(chess_array)
 
                             if valid_input:
                                 break
 
+                            if event.source == "vision":
+                                # e.g. a piece still in hand, wait for the next change
+                                print(Fore.YELLOW + "Board changed, but not by a legal move")
+                                continue
                             print("Illegal move, please try again.")
+                            self.print_unsure_squares(confidence)
+                            print("\n", "Press enter key to register move.")
                     else:
                         while True:  # Loop for valid user input
-                            inputmove = input(
+                            inputmove = self.inputs.ask(
                                 "\n"
                                 + Fore.BLUE
                                 + "Input move (SAN or UCI, 'undo'):"
@@ -237,13 +404,13 @@ class ChessGame:
                                 if self.process_move(inputmove):
                                     break # Exit the loop if the move is valid
                     if not self.chess_vision_mode and inputmove.lower() != "undo": # Only ask for confirmation if not vision mode and not undoing
-                        user_confirmation = input(Fore.YELLOW + "Confirm move? (y/N): ")
+                        user_confirmation = self.inputs.ask(Fore.YELLOW + "Confirm move? (y/N): ")
                         if user_confirmation.lower() != "y":
                             self.board.pop() # Undo the move if not confirmed
                             print(Fore.RED + "Move not confirmed.")
                             continue # Go to the next turn
                         
-                    if not self.chess_vision_mode or inputmove.lower() != "undo": # Only handle stockfish move if not vision mode or undoing
+                    if self.chess_vision_mode or inputmove.lower() != "undo": # Handle stockfish move after a vision move or a typed move that is not undo
                         self.handle_stockfish_move()
 
                 else:
@@ -255,63 +422,43 @@ class ChessGame:
         print(Fore.CYAN + "Moving to bin position...")
         print(self.board.outcome())
         print(Fore.GREEN + "Game over!")
+        if self.speculator:
+            self.speculator.report()
+            self.speculator.shutdown()
+        self.stockfish.close()
+        if self.cache:
+            self.cache.report()
+            self.cache.close()
+        self.save_timings(start)
+        if self.chess_vision_mode:
+            self.chessviz.close()
+        self.inputs.close()
+        stop_telemetry()
         disconnect_from_robot()
 
 
-class Move:
-    def __init__(
-        self,
-        piece_heights,
-        current_board,
-        position_data,
-        current_move,
-    ):
-        self.board = current_board
-        move_from = current_move[:2]
-        move_to = current_move[-2:]
-        print(move_from, move_to)
-        from_position = position_data[move_from]
-        to_position = position_data[move_to]
-        from_piece_type = current_board.piece_at(chess.parse_square(move_from))
-        to_piece_type = current_board.piece_at(chess.parse_square(move_to))
-        print(from_piece_type, to_piece_type)
-
-        if to_piece_type is None:
-            to_piece_type = from_piece_type  # Handle cases where no piece is on target square
-        to_position_height = piece_heights[to_piece_type.symbol()]
-        from_position_height = piece_heights[from_piece_type.symbol()]
-
-        self.from_pos = from_position
-        self.to_pos = to_position
-        self.from_position_height = from_position_height
-        self.to_position_height = to_position_height
-        self.to_piece_type = to_piece_type
-        self.move_from = move_from
-        self.move_to = move_to
-        self.is_capture = current_board.is_capture(chess.Move.from_uci(current_move)) # Check if this move is a capture
-
-    def main_direct_move_piece(self):
-        """
-        Directly move a piece from one position to another on the chess board
-        """
-        origin_square = chess.parse_square(self.move_from)
-        print(
-            "Moving piece",
-            self.board.piece_at(origin_square),
-            "from",
-            self.move_from,
-            "to",
-            self.move_to,
-        )
-        # Determine REMOVING_PIECE dynamically based on capture
-        removing_piece = 1 if self.is_capture else 0 # If it's a capture, we're removing a piece
-        direct_move_piece(self, removing_piece)  # Pass removing_piece
-
-    def main_remove_piece(self):
-        origin_square = chess.parse_square(self.move_from)
-        remove_piece(self, self.board, origin_square)
+def parse_args():
+    parser = argparse.ArgumentParser(description="Play chess against the UR10")
+    parser.add_argument(
+        "--non-interactive",
+        dest="interactive",
+        action="store_false",
+        default=None,
+        help="take every startup option from the flags below or config.yaml",
+    )
+    parser.add_argument(
+        "--continue-last-game", action=argparse.BooleanOptionalAction, default=None
+    )
+    parser.add_argument(
+        "--zero-player-mode", action=argparse.BooleanOptionalAction, default=None
+    )
+    parser.add_argument("--difficulty", help="easy, medium, expert or gm")
+    parser.add_argument(
+        "--chess-vision", action=argparse.BooleanOptionalAction, default=None
+    )
+    return vars(parser.parse_args())
 
 
 if __name__ == "__main__":
-    game = ChessGame()
+    game = ChessGame(options=parse_args())
     game.run()
\ No newline at end of file
@@ -1,177 +1,279 @@
 # Description: This file contains the API for the robot. It is responsible for the communication between the robot and the rest of the system.
-from time import sleep
-import socket
+import os
+import json
 import math
-import rtde_io
-import rtde_receive
-import rtde_control
+import threading
+from collections import namedtuple
+import chess
 from colorama import Fore
 import yaml
+from robot_api.backend import connect
+from robot_api.poses import BIN, GRAVEYARD, LIFT, build_pose_table, piece_level
+from robot_api.telemetry import TelemetryRecorder
+from robot_api.timing import TIMINGS, phase_bits
 
 # Load configuration from config.yaml
 with open("config.yaml", "r") as config_file:
     config = yaml.safe_load(config_file)
 
+# Board coordinates of every square from setup.json
+with open("setup.json", encoding="utf-8") as setup_file:
+    position_data = json.load(setup_file)
+
 # Robot Configuration
-HOSTNAME = config["robot"]["hostname"]  # The IP address of your Universal Robot
-HOST_PORT = config["robot"]["host_port"]  # The port to send commands to the robot
-RTDE_FREQUENCY = config["robot"]["rtde_frequency"]  # Hz to update data from robot
+BACKEND = os.environ.get("ROBOT_BACKEND", config["robot"]["backend"])  # rtde or sim
 
 # Robot Parameters
-ANGLE = config["robot_parameters"]["angle"]
-DX = config["robot_parameters"]["dx"]
-DY = config["robot_parameters"]["dy"]
-BOARD_HEIGHT = config["robot_parameters"]["board_height"]
-BOARD_LIFT_HEIGHT = config["robot_parameters"]["board_lift_height"]
-LIFT_HEIGHT = BOARD_LIFT_HEIGHT + BOARD_HEIGHT
-TCP_RX = config["robot_parameters"]["tcp_rx"]
-TCP_RY = config["robot_parameters"]["tcp_ry"]
-TCP_RZ = config["robot_parameters"]["tcp_rz"]
-BIN_POSITION = config["robot_parameters"]["bin_position"]
+GRAVEYARD_SLOTS = config["graveyard"]["rows"] * config["graveyard"]["columns"]
+# Every square, bin and graveyard pose, unit conversion and validation happen once here
+POSES = build_pose_table(position_data, config)
 MOVE_SPEED = config["robot_parameters"]["move_speed"]
 MOVE_ACCEL = config["robot_parameters"]["move_accel"]
+PATH_MODE = config["robot_parameters"]["path_mode"]
+BLEND_RADIUS = config["robot_parameters"]["blend_radius"]
 
 # Force Control Parameters
-FORCE_SECONDS = config["force_control"]["force_seconds"]
 task_frame = config["force_control"]["task_frame"]
 selection_vector = config["force_control"]["selection_vector"]
 tcp_down = config["force_control"]["tcp_down"]
 FORCE_TYPE = config["force_control"]["force_type"]
 limits = config["force_control"]["limits"]
+CONTACT_DETECTION = config["force_control"]["contact_detection"]
+CONTACT_FORCE = config["force_control"]["contact_force"]
+CONTACT_TIMEOUT = config["force_control"]["contact_timeout"]
+
+# Electromagnet
+MAGNET_INTERFACE = config["electromagnet"]["interface"]
+MAGNET_OUTPUT = config["electromagnet"]["tool_output"]
+
+# Telemetry
+TELEMETRY = config["telemetry"]
 
-rtde_io_ = rtde_io.RTDEIOInterface(HOSTNAME, RTDE_FREQUENCY)
-rtde_receive_ = rtde_receive.RTDEReceiveInterface(HOSTNAME, RTDE_FREQUENCY)
-control_interface = rtde_control.RTDEControlInterface(HOSTNAME, RTDE_FREQUENCY)
+# Wait Conditions
+POLL_INTERVAL = config["waits"]["poll_interval"]
+STEADY_SPEED = config["waits"]["steady_speed"]
+FORCE_TOLERANCE = config["waits"]["force_tolerance"]
+STEADY_TIMEOUT = config["waits"]["steady_timeout"]
+MAGNET_TIMEOUT = config["waits"]["magnet_timeout"]
+FORCE_TIMEOUT = config["waits"]["force_timeout"]
+FORCE_WINDOW = config["waits"]["force_window"]
 
+robot = None
+robot_lock = threading.Lock()
+recorder = None
 
-def translate(x, y):
+
+def connect_to_robot():
     """
-    Rotate a point by a given angle in a 2d space
+    Connect to the robot backend. Only the first call connects, so this can be
+    called ahead of time from a startup thread or lazily on first use.
     """
-    x1 = y * math.cos(ANGLE) - x * math.sin(ANGLE)
-    y1 = y * math.sin(ANGLE) + x * math.cos(ANGLE)
-    return x1 + DX, y1 + DY
+    global robot
+    if robot is None:
+        with robot_lock:
+            if robot is None:
+                robot = connect(config, BACKEND)
+    return robot
 
 
-def move_to_square(pos=BIN_POSITION, height=LIFT_HEIGHT):
+class LazyInterface:
     """
-    Move the TCP to a given position on the chess board
+    Stand-in for an RTDE interface that connects on first use
     """
-    robot_position = translate(pos["x"], pos["y"])
-    control_interface.moveL(
-        [
-            robot_position[0] / 1000,  # x
-            robot_position[1] / 1000,  # y
-            height,  # z (height of the chess board)
-            TCP_RX,  # rx (x rotation of TCP in radians)
-            TCP_RY,  # ry (y rotation of TCP in radians)
-            TCP_RZ,  # rz (z rotation of TCP in radians)
-        ],
-        MOVE_SPEED,  # speed: speed of the tool [m/s]
-        MOVE_ACCEL,  # acceleration: acceleration of the tool [m/s^2]
-    )
 
+    def __init__(self, name):
+        self.name = name
 
-TCP_CONTACT = (
-    control_interface.toolContact(  # this is not implemented correctly in python
-        [0, 0, 1, 0, 0, 0]  # a workaround may be moveUntilContact
-    )
-)  # Check if the TCP is in contact with the piece
+    def __getattr__(self, attribute):
+        return getattr(getattr(connect_to_robot(), self.name), attribute)
 
 
-def forcemode_lower():
+rtde_io_ = LazyInterface("io")
+rtde_receive_ = LazyInterface("receive")
+control_interface = LazyInterface("control")
+
+
+def monotonic():
+    # Simulated time on the simulator, wall-clock time on the robot
+    return connect_to_robot().monotonic()
+
+
+def sleep(seconds):
+    connect_to_robot().sleep(seconds)
+
+
+def wait_until(description, condition, timeout):
     """
-    Lower the TCP to make contact with the piece
+    Poll a condition on the robot state until it holds or the timeout runs out.
+    Returns True if the condition was met.
     """
-    tcp_cycles = 0
-    while TCP_CONTACT == 0 and tcp_cycles < 15:
-        t_start = control_interface.initPeriod()
-        # Move the robot down for 2 seconds
-        tcp_cycles += 1
-        control_interface.forceMode(
-            task_frame, selection_vector, tcp_down, FORCE_TYPE, limits
+    start = monotonic()
+    while not condition():
+        if monotonic() - start >= timeout:
+            print(Fore.YELLOW + f"Timed out after {timeout:.2f}s waiting for {description}")
+            return False
+        sleep(POLL_INTERVAL)
+    print(Fore.LIGHTBLACK_EX + f"Waited {monotonic() - start:.3f}s for {description}")
+    return True
+
+
+def robot_steady():
+    """
+    The TCP has stopped moving
+    """
+    speed = rtde_receive_.getActualTCPSpeed()
+    return math.hypot(*speed[:3]) < STEADY_SPEED
+
+
+def tool_voltage_reached(voltage):
+    """
+    Condition: the tool output is at the given voltage
+    """
+    return lambda: rtde_receive_.getToolOutputVoltage() == voltage
+
+
+def tool_output_reached(output, state):
+    """
+    Condition: a tool digital output reads back the given state
+    """
+    # Tool digital outputs follow the 16 standard and configurable outputs
+    return lambda: rtde_receive_.getDigitalOutState(16 + output) == state
+
+
+def force_settled():
+    """
+    Condition: the TCP force in z stayed within FORCE_TOLERANCE for
+    FORCE_WINDOW seconds. Only new samples of the receive interface count
+    (by their robot timestamp), so repeated reads of a cached value cannot
+    pass the check early.
+    """
+    samples = []  # (robot timestamp, force in z)
+
+    def check():
+        timestamp = rtde_receive_.getTimestamp()
+        if samples and timestamp == samples[-1][0]:
+            return False  # no new sample since the last check
+        samples.append((timestamp, rtde_receive_.getActualTCPForce()[2]))
+        # keep the newest sample that is at least a window old
+        while len(samples) > 1 and samples[1][0] <= timestamp - FORCE_WINDOW:
+            samples.pop(0)
+        forces = [force for _, force in samples]
+        return (
+            samples[0][0] <= timestamp - FORCE_WINDOW
+            and max(forces) - min(forces) < FORCE_TOLERANCE
         )
-        control_interface.waitPeriod(t_start)
-    if tcp_cycles == 20:
-        print(Fore.RED + "TCP was not able to find the piece")
-    control_interface.forceModeStop()
+
+    return check
+
+
+def wait_for_steady():
+    return wait_until("robot steady", robot_steady, STEADY_TIMEOUT)
+
+
+def wait_for_force_settled():
+    return wait_until("TCP force settled", force_settled(), FORCE_TIMEOUT)
+
+
+def pose(index, level=LIFT):
+    """
+    TCP pose of a square (or the bin) at a level of the pose table
+    """
+    return POSES[index, level].tolist()
 
 
-def lift_piece(pos):
+def move_to_square(index=BIN, level=LIFT):
     """
-    Lift the piece from the board
+    Move the TCP to a given square of the chess board (the bin by default)
     """
-    robot_position = translate(pos["x"], pos["y"])
-    sleep(0.5)
     control_interface.moveL(
-        [
-            robot_position[0] / 1000,  # x
-            robot_position[1] / 1000,  # y
-            LIFT_HEIGHT,  # z (height to lift piece)
-            TCP_RX,  # rx (x rotation of TCP in radians)
-            TCP_RY,  # ry (y rotation of TCP in radians)
-            TCP_RZ,  # rz (z rotation of TCP in radians)
-        ],
+        pose(index, level),
         MOVE_SPEED,  # speed: speed of the tool [m/s]
         MOVE_ACCEL,  # acceleration: acceleration of the tool [m/s^2]
     )
-    sleep(0.5)
 
 
-def lower_piece(move_instance, removing_piece):
+def distance(pose_a, pose_b):
+    return math.dist(pose_a[:3], pose_b[:3])
+
+
+def move_path(poses):
     """
-    Lower the piece to the board
+    Move through a list of poses as a single blended moveL path.
+    The arm only comes to a stop at the last pose.
     """
-    robot_position = translate(move_instance.to_pos["x"], move_instance.to_pos["y"])
-    if removing_piece == 1:
-        control_interface.moveL(
-            [
-                robot_position[0] / 1000,  # x
-                robot_position[1] / 1000,  # y
-                move_instance.from_position_height
-                + BOARD_HEIGHT,  # z (height to lift piece)
-                TCP_RX,  # rx (x rotation of TCP in radians)
-                TCP_RY,  # ry (y rotation of TCP in radians)
-                TCP_RZ,  # rz (z rotation of TCP in radians)
-            ],
-            MOVE_SPEED,  # speed: speed of the tool [m/s]
-            MOVE_ACCEL,  # acceleration: acceleration of the tool [m/s^2]
+    previous = rtde_receive_.getActualTCPPose()
+    path = []
+    for i, waypoint in enumerate(poses):
+        blend = 0.0
+        if i < len(poses) - 1:
+            # Blends of neighbouring waypoints must not overlap
+            blend = min(
+                BLEND_RADIUS,
+                distance(previous, waypoint) / 2,
+                distance(waypoint, poses[i + 1]) / 2,
+            )
+        path.append(waypoint + [MOVE_SPEED, MOVE_ACCEL, blend])
+        previous = waypoint
+    control_interface.moveL(path)
+
+
+# contact: whether the piece was touched
+# height: TCP z where the descent stopped (meters)
+# seconds: duration of the descent
+# force: TCP force in z at the end of the descent (N)
+ContactResult = namedtuple("ContactResult", ["contact", "height", "seconds", "force"])
+
+
+def in_contact(start_force):
+    """
+    The TCP touches the piece, by the configured contact detection
+    """
+    if CONTACT_DETECTION == "tool_contact":
+        return control_interface.toolContact([0, 0, 1, 0, 0, 0]) > 0
+    force = rtde_receive_.getActualTCPForce()[2]
+    return abs(force - start_force) > CONTACT_FORCE
+
+
+def forcemode_lower():
+    """
+    Lower the TCP until it touches the piece, checking for contact every
+    control cycle, and stop there. Returns a ContactResult.
+    """
+    start = monotonic()
+    start_force = rtde_receive_.getActualTCPForce()[2]
+    contact = False
+    if CONTACT_DETECTION == "move_until_contact":
+        # The controller descends at the force-mode z speed limit and stops on contact
+        contact = control_interface.moveUntilContact(
+            [0, 0, -limits[2], 0, 0, 0], [0, 0, -1, 0, 0, 0], MOVE_ACCEL
         )
     else:
-        control_interface.moveL(
-            [
-                robot_position[0] / 1000,  # x
-                robot_position[1] / 1000,  # y
-                move_instance.to_position_height
-                + BOARD_HEIGHT,  # z (height to lift piece)
-                TCP_RX,  # rx (x rotation of TCP in radians)
-                TCP_RY,  # ry (y rotation of TCP in radians)
-                TCP_RZ,  # rz (z rotation of TCP in radians)
-            ],
-            MOVE_SPEED,  # speed: speed of the tool [m/s]
-            MOVE_ACCEL,  # acceleration: acceleration of the tool [m/s^2]
-        )
-    sleep(0.5)
+        # One contact check per control cycle, at the rate the controller runs
+        # (0 on error: assume the slowest, CB3, rate)
+        step_time = control_interface.getStepTime() or 1.0 / 125
+        for _ in range(int(CONTACT_TIMEOUT / step_time)):
+            t_start = control_interface.initPeriod()
+            control_interface.forceMode(
+                task_frame, selection_vector, tcp_down, FORCE_TYPE, limits
+            )
+            if in_contact(start_force):
+                contact = True
+                break
+            control_interface.waitPeriod(t_start)
+        control_interface.forceModeStop()
+    return ContactResult(
+        contact,
+        rtde_receive_.getActualTCPPose()[2],
+        monotonic() - start,
+        rtde_receive_.getActualTCPForce()[2],
+    )
 
 
 def send_command_to_robot(command):
     """
     Send a command to the robot directly using a socket connection
     """
-    # Connect to the robot
-    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    sock.connect((HOSTNAME, HOST_PORT))
-
-    # Send the command to the robot
-    sock.send(bytes(command, "utf-8"))
-
-    # Receive and print the response from the robot
-    # response = sock.recv(1024)
-    # print("Response from robot:", response)
-
-    # Close the connection
-    sock.close()
-    sleep(0.5)  # Allow the piece to attach to the electromagnet
+    connect_to_robot().send_program(command)
 
 
 OUTPUT_24 = "sec myProg():\n\
@@ -186,6 +288,48 @@ end\n\
 myProg()\n"
 
 
+def set_electromagnet(energized):
+    """
+    Switch the electromagnet and wait until the robot reports the new state
+    """
+    if MAGNET_INTERFACE == "secondary_script":
+        voltage = 24 if energized else 0
+        send_command_to_robot(OUTPUT_24 if energized else OUTPUT_0)
+        return wait_until(
+            f"tool output voltage {voltage}V",
+            tool_voltage_reached(voltage),
+            MAGNET_TIMEOUT,
+        )
+    # Persistent RTDE IO connection, no new socket or secondary program
+    rtde_io_.setToolDigitalOut(MAGNET_OUTPUT, energized)
+    return wait_until(
+        f"tool digital output {MAGNET_OUTPUT} {'on' if energized else 'off'}",
+        tool_output_reached(MAGNET_OUTPUT, energized),
+        MAGNET_TIMEOUT,
+    )
+
+
+def start_telemetry():
+    """
+    Start recording robot state into the telemetry ring file
+    """
+    global recorder
+    if recorder is None:
+        source = connect_to_robot().telemetry(TELEMETRY["frequency"])
+        recorder = TelemetryRecorder(
+            source, TELEMETRY["path"], TELEMETRY["capacity"], TELEMETRY["frequency"]
+        )
+        recorder.start()
+    return recorder
+
+
+def stop_telemetry():
+    global recorder
+    if recorder is not None:
+        recorder.stop()
+        recorder = None
+
+
 def disconnect_from_robot():
     """
     Disconnect from the robot
@@ -193,45 +337,114 @@ def disconnect_from_robot():
     control_interface.stopScript()  # Disconnect from the robot
 
 
-def direct_move_piece(move, removing_piece):
-    board_height = move.from_position_height + BOARD_HEIGHT
-    move_to_square(move.from_pos, LIFT_HEIGHT)
-    print(Fore.LIGHTBLUE_EX + "Energizing electromagnet...")
-    send_command_to_robot(OUTPUT_24)  # energize the electromagnet
-    move_to_square(move.from_pos, board_height)
-    print(Fore.CYAN + "Lowering TCP...")
-    sleep(0.2)
-    forcemode_lower()
-    print(Fore.CYAN + "Lifting piece...")
-    lift_piece(move.from_pos)
-    print("Moving piece to", move.move_to)
-    move_to_square(move.to_pos, LIFT_HEIGHT)
-    print("Lowering piece...")
-    lower_piece(move, removing_piece)
-    print(Fore.LIGHTBLUE_EX + "De-energizing electromagnet...")
-    send_command_to_robot(OUTPUT_0)  # de-energize the electromagnet
-    sleep(1)
-    move_to_square(move.to_pos, LIFT_HEIGHT)
-    print(Fore.CYAN + "Piece moved successfully!")
-
-
-def remove_piece(move, board, origin_square):
-    board_height = move.to_position_height + BOARD_HEIGHT
-    print("Removing piece", board.piece_at(origin_square), "from", move.move_to)
-    move_to_square(move.to_pos, LIFT_HEIGHT)
-    print(Fore.LIGHTBLUE_EX + "Energizing electromagnet...")
-    send_command_to_robot(OUTPUT_24)  # energize the electromagnet
-    move_to_square(move.to_pos, board_height)
-    print(Fore.CYAN + "Lowering TCP...")
-    sleep(0.2)
-    forcemode_lower()
-    print(Fore.CYAN + "Lifting piece...")
-    move_to_square(move.to_pos, LIFT_HEIGHT)
-    lift_piece(move.to_pos)
-    print("Moving piece to ex")
-    move_to_square(BIN_POSITION, LIFT_HEIGHT)  # move to the side position
-    print(Fore.LIGHTBLUE_EX + "De-energizing electromagnet...")
-    send_command_to_robot(OUTPUT_0)  # de-energize the electromagnet
-    move_to_square(BIN_POSITION, LIFT_HEIGHT)
-    move_to_square(BIN_POSITION, LIFT_HEIGHT)
-    print(Fore.CYAN + "Piece removed successfully!")
+def move_through(segments):
+    """
+    Move through a list of (phase, pose) segments, skipping repeated poses. In
+    path mode this is one blended path, otherwise one moveL per pose. The time
+    of every segment is recorded under its phase.
+    """
+    phases = []
+    waypoints = []
+    for phase, waypoint in segments:
+        if not waypoints or waypoint != waypoints[-1]:
+            phases.append(phase)
+            waypoints.append(waypoint)
+    if not waypoints:
+        return
+    if PATH_MODE:
+        previous = rtde_receive_.getActualTCPPose()
+        TIMINGS.active = phase_bits(phases)
+        start = monotonic()
+        move_path(waypoints)
+        wait_for_steady()
+        elapsed = monotonic() - start
+        TIMINGS.active = 0
+        # A blended path doesn't report when it passes a waypoint, so its
+        # time is split over the segments by length
+        lengths = []
+        for waypoint in waypoints:
+            lengths.append(distance(previous, waypoint))
+            previous = waypoint
+        total = sum(lengths)
+        for phase, length in zip(phases, lengths):
+            TIMINGS.record(phase, elapsed * length / total if total else 0.0)
+    else:
+        for i, (phase, waypoint) in enumerate(zip(phases, waypoints)):
+            with TIMINGS.measure(phase, monotonic):
+                control_interface.moveL(waypoint, MOVE_SPEED, MOVE_ACCEL)
+                if i == len(waypoints) - 1:
+                    wait_for_steady()
+
+
+def square_name(index):
+    if index == BIN:
+        return "ex"
+    if index >= GRAVEYARD:
+        return f"graveyard slot {index - GRAVEYARD}"
+    return chess.square_name(index)
+
+
+def execute_plan(plan):
+    """
+    Carry out the transfers of a move plan (see robot_api.planner) in order.
+    The retract from one placement is blended into the approach of the next,
+    and the electromagnet is only energized once the TCP is back at lift
+    height, so it never grabs the piece it just released.
+    Returns the ContactResult of every pick.
+    """
+    retract = []
+    contacts = []
+    for transfer in plan:
+        if transfer.source is None:
+            print(
+                Fore.YELLOW
+                + f"Please place a {transfer.piece} on {square_name(transfer.target)}"
+            )
+            continue
+        pick_level = piece_level(transfer.piece)
+        place_level = LIFT if transfer.target == BIN else pick_level
+        print(
+            "Moving piece",
+            transfer.piece,
+            "from",
+            square_name(transfer.source),
+            "to",
+            square_name(transfer.target),
+        )
+        move_through(retract + [("approach", pose(transfer.source, LIFT))])
+        print(Fore.LIGHTBLUE_EX + "Energizing electromagnet...")
+        with TIMINGS.measure("grip", monotonic):
+            set_electromagnet(True)
+        print(Fore.CYAN + "Lowering TCP...")
+        move_through([("descend", pose(transfer.source, pick_level))])
+        with TIMINGS.measure("contact_search", monotonic):
+            contact = forcemode_lower()
+            wait_for_force_settled()  # the piece is held by the electromagnet
+        contacts.append(contact)
+        if contact.contact:
+            print(
+                Fore.LIGHTBLACK_EX
+                + f"Contact at z={contact.height:.4f} m after {contact.seconds:.3f}s"
+            )
+        else:
+            print(
+                Fore.YELLOW
+                + f"No contact with the {transfer.piece} on {square_name(transfer.source)} "
+                + f"after {contact.seconds:.2f}s, stopped at z={contact.height:.4f} m"
+            )
+        print(Fore.CYAN + "Moving piece to", square_name(transfer.target))
+        move_through(
+            [
+                ("lift", pose(transfer.source, LIFT)),
+                ("transfer", pose(transfer.target, LIFT)),
+                ("lower", pose(transfer.target, place_level)),
+            ]
+        )
+        print(Fore.LIGHTBLUE_EX + "De-energizing electromagnet...")
+        with TIMINGS.measure("release", monotonic):
+            set_electromagnet(False)
+            wait_for_force_settled()  # the piece has come off the electromagnet
+        retract = [("retract", pose(transfer.target, LIFT))]
+    move_through(retract)
+    print(Fore.CYAN + "Move completed successfully!")
+    return contacts
@@ -0,0 +1,78 @@
+"""
+Robot backends: the UR10 over RTDE, or the local simulator.
+
+config.yaml selects the backend with robot.backend; the ROBOT_BACKEND
+environment variable overrides it (used by the benchmarks).
+"""
+
+import socket
+import time
+from robot_api.simulator import SimulatedRobot, SimulatedTelemetry
+from robot_api.telemetry import VARIABLES
+
+
+class RTDEBackend:
+    def __init__(self, config):
+        # Only needed when talking to the real robot
+        import rtde_io
+        import rtde_receive
+        import rtde_control
+
+        self.hostname = config["robot"]["hostname"]
+        self.host_port = config["robot"]["host_port"]
+        frequency = config["robot"]["rtde_frequency"]
+        control_frequency = config["robot"]["control_frequency"]
+        self.io = rtde_io.RTDEIOInterface(self.hostname, frequency)
+        # The contact check of the force-mode descent reads the TCP force
+        # every control cycle, so the state must refresh at the same rate.
+        # -1 lets ur_rtde use the rate of the controller it connects to.
+        self.receive = rtde_receive.RTDEReceiveInterface(self.hostname, control_frequency)
+        self.control = rtde_control.RTDEControlInterface(self.hostname, control_frequency)
+        self.monotonic = time.monotonic
+        self.sleep = time.sleep
+
+    def send_program(self, program):
+        """
+        Send a secondary program to the robot directly using a socket connection
+        """
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.connect((self.hostname, self.host_port))
+        sock.send(bytes(program, "utf-8"))
+        sock.close()
+
+    def telemetry(self, frequency):
+        """
+        Separate receive connection for the telemetry recorder that only
+        subscribes to the recorded fields
+        """
+        import rtde_receive
+
+        return rtde_receive.RTDEReceiveInterface(self.hostname, frequency, VARIABLES)
+
+
+class SimulatedBackend:
+    def __init__(self, config):
+        frequency = config["robot"]["control_frequency"]
+        if frequency <= 0:
+            frequency = config["simulator"]["control_frequency"]
+        self.robot = SimulatedRobot(config["simulator"], frequency)
+        self.io = self.robot
+        self.receive = self.robot
+        self.control = self.robot
+        self.monotonic = self.robot.monotonic
+        self.sleep = self.robot.sleep
+        self.send_program = self.robot.send_program
+
+    def telemetry(self, frequency):
+        return SimulatedTelemetry(self.robot, frequency)
+
+
+BACKENDS = {"rtde": RTDEBackend, "sim": SimulatedBackend}
+
+
+def connect(config, name):
+    try:
+        backend = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown robot backend: {name}")
+    return backend(config)
@@ -0,0 +1,76 @@
+"""
+Off-board slots for captured pieces.
+
+The graveyard is a grid of slots next to the board (graveyard in config.yaml)
+whose poses follow the bin in the pose table. A captured piece goes to the
+free slot closest to its square, and a promotion takes the matching piece
+back out of its slot.
+"""
+
+import json
+import numpy as np
+from robot_api.poses import GRAVEYARD, LIFT
+
+
+class Graveyard:
+    def __init__(self, poses, size, slots=None):
+        self.xy = poses[:, LIFT, :2]
+        self.slots = list(slots) if slots is not None else [None] * size
+        if len(self.slots) != size:
+            raise ValueError(f"Saved graveyard has {len(self.slots)} slots, config has {size}")
+
+    @staticmethod
+    def index(slot):
+        """
+        Pose table index of a slot
+        """
+        return GRAVEYARD + slot
+
+    def _nearest(self, slots, square):
+        if not slots:
+            return None
+        distances = np.linalg.norm(
+            self.xy[[self.index(slot) for slot in slots]] - self.xy[square], axis=1
+        )
+        return self.index(slots[int(distances.argmin())])
+
+    def free_slot(self, square, reserved=()):
+        """
+        Pose index of the free slot closest to a square, or None if full
+        """
+        slots = [
+            slot
+            for slot, piece in enumerate(self.slots)
+            if piece is None and self.index(slot) not in reserved
+        ]
+        return self._nearest(slots, square)
+
+    def find(self, piece, square, reserved=()):
+        """
+        Pose index of the slot holding a piece closest to a square, or None
+        """
+        slots = [
+            slot
+            for slot, held in enumerate(self.slots)
+            if held == piece and self.index(slot) not in reserved
+        ]
+        return self._nearest(slots, square)
+
+    def apply(self, plan):
+        """
+        Update slot occupancy after a plan was carried out
+        """
+        for transfer in plan:
+            if transfer.source is not None and transfer.source >= GRAVEYARD:
+                self.slots[transfer.source - GRAVEYARD] = None
+            if transfer.target >= GRAVEYARD:
+                self.slots[transfer.target - GRAVEYARD] = transfer.piece
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as file_obj:
+            json.dump(self.slots, file_obj)
+
+    @classmethod
+    def load(cls, path, poses, size):
+        with open(path, "r", encoding="utf-8") as file_obj:
+            return cls(poses, size, json.load(file_obj))
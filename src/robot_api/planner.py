@@ -0,0 +1,115 @@
+"""
+Turns a chess.Move into one ordered list of pick/place transfers for the arm.
+
+Captures, en passant, castling and promotion all become plain transfers of
+single pieces, with captured pieces going to the graveyard (or the bin) and
+promoted pieces coming back out of it. When more than one order is possible
+the planner picks the one with the least arm travel.
+"""
+
+import itertools
+from collections import namedtuple
+import chess
+import numpy as np
+from robot_api.poses import BIN, LIFT
+
+# piece: symbol of the carried piece
+# source: square index, graveyard slot index, or None when the piece has to
+#         be placed by hand
+# target: square index, graveyard slot index or BIN
+Transfer = namedtuple("Transfer", ["piece", "source", "target"])
+
+
+def move_transfers(board, move, graveyard=None):
+    """
+    Every piece a move displaces, in no particular order. Pieces leaving the
+    board go to the graveyard when there is one with free slots, else the bin.
+    """
+    piece = board.piece_at(move.from_square)
+    transfers = []
+    reserved = set()  # graveyard slots already used by this move
+
+    def discard(symbol, square):
+        target = graveyard.free_slot(square, reserved) if graveyard else None
+        if target is None:
+            target = BIN
+        reserved.add(target)
+        transfers.append(Transfer(symbol, square, target))
+
+    if board.is_en_passant(move):
+        # the captured pawn sits behind the target square
+        captured = move.to_square + (-8 if piece.color == chess.WHITE else 8)
+        discard(board.piece_at(captured).symbol(), captured)
+    elif board.piece_at(move.to_square):
+        discard(board.piece_at(move.to_square).symbol(), move.to_square)
+
+    if board.is_castling(move):
+        rank = chess.square_rank(move.from_square)
+        if board.is_kingside_castling(move):
+            rook_from, rook_to = chess.square(7, rank), chess.square(5, rank)
+        else:
+            rook_from, rook_to = chess.square(0, rank), chess.square(3, rank)
+        transfers.append(Transfer(piece.symbol(), move.from_square, move.to_square))
+        transfers.append(Transfer(board.piece_at(rook_from).symbol(), rook_from, rook_to))
+    elif move.promotion:
+        promoted = chess.Piece(move.promotion, piece.color).symbol()
+        source = graveyard.find(promoted, move.to_square, reserved) if graveyard else None
+        discard(piece.symbol(), move.from_square)
+        transfers.append(Transfer(promoted, source, move.to_square))
+    else:
+        transfers.append(Transfer(piece.symbol(), move.from_square, move.to_square))
+    return transfers
+
+
+def is_feasible(board, order):
+    """
+    Every piece is picked up from an occupied square and put on a free one
+    """
+    occupied = board.occupied
+    for transfer in order:
+        if transfer.target < BIN:
+            if occupied & chess.BB_SQUARES[transfer.target]:
+                return False
+            occupied |= chess.BB_SQUARES[transfer.target]
+        if transfer.source is not None and transfer.source < BIN:
+            occupied &= ~chess.BB_SQUARES[transfer.source]
+    return True
+
+
+def travel(order, poses, start):
+    """
+    Distance the arm covers at lift height for an order of transfers
+    """
+    xy = poses[:, LIFT, :2]
+    position = start
+    distance = 0.0
+    for transfer in order:
+        if transfer.source is None:
+            continue  # placed by hand
+        distance += np.linalg.norm(xy[transfer.source] - xy[position])
+        distance += np.linalg.norm(xy[transfer.target] - xy[transfer.source])
+        position = transfer.target
+    return distance
+
+
+def plan_move(board, move, poses, start=BIN, graveyard=None):
+    """
+    Ordered transfers that carry out a move with the least arm travel.
+    board is the position before the move, start the index the arm is at.
+    """
+    transfers = move_transfers(board, move, graveyard)
+    orders = [
+        order
+        for order in itertools.permutations(transfers)
+        if is_feasible(board, order)
+    ]
+    # Pieces placed by hand come last, so the arm is out of the way
+    return list(
+        min(
+            orders,
+            key=lambda order: (
+                [transfer.source is None for transfer in order],
+                travel(order, poses, start),
+            ),
+        )
+    )
@@ -0,0 +1,106 @@
+"""
+Compiled table of TCP poses, built once from setup.json and config.yaml.
+
+POSES[index, level] is the full 6-DoF TCP pose (meters, radians) for
+index 0-63 (the python-chess square numbers, a1 = 0), BIN or a graveyard
+slot (GRAVEYARD + slot number), at level LIFT or at the pick height of a
+piece type (see piece_level).
+"""
+
+import math
+import chess
+import numpy as np
+
+PIECE_SYMBOLS = "PNBRQKpnbrqk"
+LIFT = 0  # level of the travel height above the board
+BIN = 64  # index of the bin after the 64 squares
+GRAVEYARD = 65  # index of the first graveyard slot after the bin
+UR10_REACH = 1.3  # meters from the base
+
+
+def piece_level(symbol):
+    """
+    Level of the pick height of a piece, e.g. piece_level("Q")
+    """
+    return 1 + PIECE_SYMBOLS.index(symbol)
+
+
+def graveyard_points(graveyard):
+    """
+    Board coordinates of the graveyard slots, row by row
+    """
+    points = []
+    for row in range(graveyard["rows"]):
+        for column in range(graveyard["columns"]):
+            points.append(
+                {
+                    "x": graveyard["origin"]["x"] + row * graveyard["pitch"],
+                    "y": graveyard["origin"]["y"] + column * graveyard["pitch"],
+                }
+            )
+    return points
+
+
+def board_points(position_data, config):
+    """
+    (x, y) board coordinates in mm of every square, the bin and the graveyard
+    slots, in pose table order
+    """
+    points = [position_data[chess.square_name(square)] for square in chess.SQUARES]
+    points.append(config["robot_parameters"]["bin_position"])
+    points.extend(graveyard_points(config["graveyard"]))
+    return np.array([[point["x"], point["y"]] for point in points], dtype=float)
+
+
+def to_robot_frame(points, robot_parameters):
+    """
+    Rotate board coordinates (mm) into the robot base frame (meters)
+    """
+    angle = robot_parameters["angle"]
+    if not -360 <= angle <= 360:
+        raise ValueError(f"robot_parameters.angle must be in degrees, got {angle}")
+    angle = math.radians(angle)
+    x, y = points[:, 0], points[:, 1]
+    robot_x = y * math.cos(angle) - x * math.sin(angle) + robot_parameters["dx"]
+    robot_y = y * math.sin(angle) + x * math.cos(angle) + robot_parameters["dy"]
+    return np.stack([robot_x, robot_y], axis=1) / 1000
+
+
+def build_pose_table(position_data, config):
+    """
+    Poses of every square, the bin and the graveyard slots at the lift height
+    and at the pick height of every piece type
+    """
+    robot_parameters = config["robot_parameters"]
+    board_height = robot_parameters["board_height"]
+    lift_height = board_height + robot_parameters["board_lift_height"]
+    piece_heights = config["piece_heights"]
+
+    heights = [lift_height]
+    for symbol in PIECE_SYMBOLS:
+        piece_height = piece_heights[symbol]
+        if not 0 < piece_height < robot_parameters["board_lift_height"]:
+            raise ValueError(
+                f"piece_heights.{symbol} must be in meters between 0 and the lift height, got {piece_height}"
+            )
+        heights.append(board_height + piece_height)
+
+    xy = to_robot_frame(board_points(position_data, config), robot_parameters)
+
+    table = np.empty((len(xy), len(heights), 6))
+    table[:, :, 0] = xy[:, 0, np.newaxis]
+    table[:, :, 1] = xy[:, 1, np.newaxis]
+    table[:, :, 2] = heights
+    table[:, :, 3] = robot_parameters["tcp_rx"]
+    table[:, :, 4] = robot_parameters["tcp_ry"]
+    table[:, :, 5] = robot_parameters["tcp_rz"]
+
+    if not np.isfinite(table).all():
+        raise ValueError("Pose table contains non-finite values")
+    reach = np.linalg.norm(table[:, :, :3], axis=-1)
+    if reach.max() > UR10_REACH:
+        raise ValueError(
+            f"Pose table reaches {reach.max():.3f} m from the base, beyond the UR10's {UR10_REACH} m"
+        )
+    table.flags.writeable = False
+    return table
@@ -0,0 +1,177 @@
+"""
+Local stand-in for the UR10 so the move sequence can run without a robot.
+
+SimulatedRobot implements the parts of RTDEIOInterface, RTDEReceiveInterface
+and RTDEControlInterface that robot_api uses. Nothing moves in real time:
+every call advances a simulated clock by what the robot would need, using a
+trapezoidal velocity profile from the requested speed and acceleration.
+"""
+
+import math
+import time
+
+
+def trapezoid_time(distance, speed, accel):
+    """
+    Time to travel a distance from rest to rest with a trapezoidal profile
+    """
+    if distance <= 0:
+        return 0.0
+    if distance >= speed * speed / accel:
+        return distance / speed + speed / accel
+    return 2 * math.sqrt(distance / accel)  # never reaches full speed
+
+
+class SimulatedRobot:
+    def __init__(self, settings, frequency):
+        self.time = 0.0
+        self.period = 1.0 / frequency
+        self.pose = list(settings["start_pose"])
+        self.contact_travel = settings["contact_travel"]
+        self.io_latency = settings["io_latency"]
+        self.tool_outputs = [False, False]
+        self.tool_voltage = 0
+        self.force_mode = None  # force mode arguments while it is active
+        self.force_start_height = None
+        self.contact_cycles = 0
+        self.moves = 0
+
+    # --- clock ---
+
+    def monotonic(self):
+        return self.time
+
+    def sleep(self, seconds):
+        self.time += seconds
+
+    # --- RTDEControlInterface ---
+
+    def moveL(self, pose, speed=0.25, acceleration=1.2, asynchronous=False):
+        if isinstance(pose[0], (list, tuple)):
+            # blended path: the arm only accelerates and stops once
+            path = pose
+            speed, acceleration = path[0][6], path[0][7]
+            length = 0.0
+            previous = self.pose
+            for waypoint in path:
+                length += math.dist(previous[:3], waypoint[:3])
+                previous = waypoint
+            self.time += trapezoid_time(length, speed, acceleration)
+            self.pose = list(path[-1][:6])
+        else:
+            distance = math.dist(self.pose[:3], pose[:3])
+            self.time += trapezoid_time(distance, speed, acceleration)
+            self.pose = list(pose[:6])
+        self.moves += 1
+        return True
+
+    def moveUntilContact(self, xd, direction=None, acceleration=0.5):
+        # Descends at the requested z speed until it touches the piece
+        self.time += trapezoid_time(self.contact_travel, abs(xd[2]), acceleration)
+        self.pose[2] -= self.contact_travel
+        return True
+
+    def forceMode(self, task_frame, selection_vector, wrench, type, limits):
+        if self.force_mode is None:
+            self.force_start_height = self.pose[2]
+        self.force_mode = (selection_vector, wrench, limits)
+        return True
+
+    def forceModeStop(self):
+        self.force_mode = None
+        self.force_start_height = None
+        self.contact_cycles = 0
+        return True
+
+    def getStepTime(self):
+        return self.period
+
+    def initPeriod(self):
+        return self.time
+
+    def waitPeriod(self, t_start):
+        self.time = max(self.time, t_start + self.period)
+        if self.force_mode is not None:
+            self._descend(self.period)
+
+    def _descend(self, seconds):
+        # The force-mode descent runs at the z speed limit until the piece
+        _, _, limits = self.force_mode
+        lowest = self.force_start_height - self.contact_travel
+        if self.pose[2] > lowest:
+            self.pose[2] = max(lowest, self.pose[2] - limits[2] * seconds)
+        else:
+            self.contact_cycles += 1
+
+    def toolContact(self, direction):
+        return self.contact_cycles
+
+    def stopScript(self):
+        pass
+
+    # --- RTDEIOInterface ---
+
+    def setToolDigitalOut(self, output_id, signal_level):
+        self.time += self.io_latency
+        self.tool_outputs[output_id] = bool(signal_level)
+        return True
+
+    # --- RTDEReceiveInterface ---
+
+    def getActualTCPPose(self):
+        return list(self.pose)
+
+    def getTimestamp(self):
+        return self.time
+
+    def getRobotMode(self):
+        return 7  # RUNNING
+
+    def getActualQd(self):
+        return [0.0] * 6  # moveL blocks until the arm has stopped
+
+    def getActualTCPSpeed(self):
+        return [0.0] * 6  # moveL blocks until the arm has stopped
+
+    def getActualTCPForce(self):
+        if self.force_mode is not None and self.contact_cycles > 0:
+            return list(self.force_mode[1])
+        return [0.0] * 6
+
+    def getToolOutputVoltage(self):
+        return self.tool_voltage
+
+    def getDigitalOutState(self, output_id):
+        return self.tool_outputs[output_id - 16] if output_id >= 16 else False
+
+    # --- secondary programs ---
+
+    def send_program(self, program):
+        self.time += self.io_latency
+        if "set_tool_voltage(24)" in program:
+            self.tool_voltage = 24
+        elif "set_tool_voltage(0)" in program:
+            self.tool_voltage = 0
+
+
+class SimulatedTelemetry:
+    """
+    Receive interface of the telemetry recorder on the simulator. It samples
+    the simulated robot's current state in wall-clock time, without touching
+    the simulated clock.
+    """
+
+    def __init__(self, robot, frequency):
+        self.robot = robot
+        self.period = 1.0 / frequency
+
+    def initPeriod(self):
+        return time.monotonic()
+
+    def waitPeriod(self, t_start):
+        remaining = t_start + self.period - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+
+    def __getattr__(self, attribute):
+        return getattr(self.robot, attribute)
@@ -0,0 +1,185 @@
+"""
+High-rate robot telemetry in a memory-mapped ring file.
+
+A recorder thread samples the TCP pose and force, joint speeds, tool output
+voltage and robot mode on its own RTDE receive connection (up to 500 Hz) and
+writes them into a fixed-size NumPy memmap. The file has a small header and
+never grows; once it is full the oldest records are overwritten. The header
+counts the records written and is updated after every record, so after a
+crash the file still holds the last minutes before it. Every record carries
+the ply and the phase bits of the move being made (see robot_api.timing),
+so a recording can be sliced by move and phase offline:
+
+    python -m robot_api.telemetry telemetry/robot.ring
+"""
+
+import os
+import sys
+import threading
+import time
+import numpy as np
+from colorama import Fore
+from robot_api.timing import PHASES, TIMINGS
+
+MAGIC = b"UR10TLM1"
+
+# Fields read from the robot, as ur_rtde receive variable names
+VARIABLES = [
+    "timestamp",
+    "actual_TCP_pose",
+    "actual_TCP_force",
+    "actual_qd",
+    "tool_output_voltage",
+    "robot_mode",
+]
+
+HEADER = np.dtype(
+    [
+        ("magic", "S8"),
+        ("capacity", "<u8"),
+        ("written", "<u8"),  # records written since the file was created
+        ("frequency", "<f8"),
+        ("phases", "S248"),  # comma-separated names of the phase bits
+    ]
+)
+
+RECORD = np.dtype(
+    [
+        ("time", "<f8"),  # robot timestamp (seconds)
+        ("move", "<u2"),  # ply of the move being made
+        ("phases", "<u2"),  # bits of the phases running (see robot_api.timing.PHASES)
+        ("mode", "<i4"),  # robot mode
+        ("pose", "<f8", 6),  # actual TCP pose
+        ("force", "<f8", 6),  # actual TCP force
+        ("qd", "<f8", 6),  # actual joint speeds
+        ("voltage", "<f4"),  # tool output voltage
+    ]
+)
+
+
+def open_ring(path, capacity=None, frequency=0.0):
+    """
+    Header and records of a ring file. A new file of the given capacity is
+    created if there is none or it has a different capacity.
+    """
+    size = HEADER.itemsize + capacity * RECORD.itemsize if capacity else None
+    if size is not None and (not os.path.exists(path) or os.path.getsize(path) != size):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "wb") as file_obj:
+            file_obj.truncate(size)
+        header = np.memmap(path, dtype=HEADER, mode="r+", shape=(1,))
+        header["magic"] = MAGIC
+        header["capacity"] = capacity
+        header["phases"] = ",".join(PHASES).encode()
+        header.flush()
+        del header
+    mode = "r+" if capacity else "r"
+    header = np.memmap(path, dtype=HEADER, mode=mode, shape=(1,))
+    if header["magic"][0] != MAGIC:
+        raise ValueError(f"{path} is not a telemetry ring file")
+    if capacity:
+        header["frequency"] = frequency
+    records = np.memmap(
+        path,
+        dtype=RECORD,
+        mode=mode,
+        offset=HEADER.itemsize,
+        shape=(int(header["capacity"][0]),),
+    )
+    return header, records
+
+
+class TelemetryRecorder(threading.Thread):
+    def __init__(self, source, path, capacity, frequency):
+        super().__init__(daemon=True, name="telemetry")
+        self.source = source  # receive interface of the recorder (see robot_api.backend)
+        self.header, self.records = open_ring(path, capacity, frequency)
+        self.capacity = len(self.records)
+        self.written = int(self.header["written"][0])
+        # Field views are bound once, so a sample is written in place
+        self.time = self.records["time"]
+        self.move = self.records["move"]
+        self.phases = self.records["phases"]
+        self.mode = self.records["mode"]
+        self.pose = self.records["pose"]
+        self.force = self.records["force"]
+        self.qd = self.records["qd"]
+        self.voltage = self.records["voltage"]
+        self.written_view = self.header["written"]
+        self.running = True
+
+    def run(self):
+        source = self.source
+        last_flush = time.monotonic()
+        print(Fore.LIGHTBLACK_EX + f"Recording telemetry at {self.header['frequency'][0]:g} Hz")
+        while self.running:
+            t_start = source.initPeriod()
+            i = self.written % self.capacity
+            self.time[i] = source.getTimestamp()
+            self.move[i] = TIMINGS.move
+            self.phases[i] = TIMINGS.active
+            self.mode[i] = source.getRobotMode()
+            self.pose[i] = source.getActualTCPPose()
+            self.force[i] = source.getActualTCPForce()
+            self.qd[i] = source.getActualQd()
+            self.voltage[i] = source.getToolOutputVoltage()
+            self.written += 1
+            self.written_view[0] = self.written  # after the record, so a crash never counts a half record
+            if time.monotonic() - last_flush > 1.0:
+                self.records.flush()
+                self.header.flush()
+                last_flush = time.monotonic()
+            source.waitPeriod(t_start)
+        self.records.flush()
+        self.header.flush()
+
+    def stop(self):
+        self.running = False
+        self.join()
+        print(Fore.LIGHTBLACK_EX + f"Recorded {self.written} telemetry samples")
+
+
+def load(path):
+    """
+    Records of a ring file in the order they were written
+    """
+    header, records = open_ring(path)
+    written = int(header["written"][0])
+    capacity = len(records)
+    if written <= capacity:
+        return np.array(records[:written])
+    start = written % capacity
+    return np.concatenate([records[start:], records[:start]])
+
+
+def select(records, move=None, phase=None):
+    """
+    Records of one move (ply) and/or one phase, e.g.
+    select(load(path), move=12, phase="contact_search")
+    """
+    mask = np.ones(len(records), dtype=bool)
+    if move is not None:
+        mask &= records["move"] == move
+    if phase is not None:
+        mask &= (records["phases"] & (1 << PHASES.index(phase))) != 0
+    return records[mask]
+
+
+def summarize(records):
+    if not len(records):
+        print("No samples recorded")
+        return
+    print(f"{len(records)} samples over {records['time'][-1] - records['time'][0]:.1f}s")
+    for phase in PHASES:
+        samples = select(records, phase=phase)
+        if len(samples):
+            print(
+                f"{phase:>14}: {len(samples):7d} samples, "
+                f"peak |Fz| {np.abs(samples['force'][:, 2]).max():6.1f} N"
+            )
+
+
+if __name__ == "__main__":
+    summarize(load(sys.argv[1]))
@@ -0,0 +1,145 @@
+"""
+Per-phase timing of robot moves.
+
+Every phase of a move (engine think, approach, descend, contact search, ...)
+is timed with a monotonic clock and counted into a fixed-bucket histogram in
+memory. Recording a sample is a bisect and two additions, so it can stay on
+in the hot path. The histograms are dumped once per game as Prometheus text
+or JSON.
+"""
+
+import bisect
+import json
+import os
+import time
+from contextlib import contextmanager
+from colorama import Fore
+
+# Upper bounds of the histogram buckets in seconds, +Inf is implied
+BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Phases of a move, in order. Bit i of PhaseTimings.active is set while
+# PHASES[i] runs; a blended path sets the bits of all of its segments.
+PHASES = (
+    "engine_think",
+    "grip",
+    "approach",
+    "descend",
+    "contact_search",
+    "lift",
+    "transfer",
+    "lower",
+    "release",
+    "retract",
+)
+
+
+def phase_bits(phases):
+    bits = 0
+    for phase in phases:
+        bits |= 1 << PHASES.index(phase)
+    return bits
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+
+class PhaseTimings:
+    def __init__(self):
+        self.histograms = {}  # phase -> Histogram, in the order phases first ran
+        self.move = 0  # ply of the move being made, read by the telemetry recorder
+        self.active = 0  # bits of the phases running right now (see PHASES)
+
+    def record(self, phase, seconds):
+        histogram = self.histograms.get(phase)
+        if histogram is None:
+            histogram = self.histograms[phase] = Histogram()
+        histogram.add(seconds)
+
+    @contextmanager
+    def measure(self, phase, clock=time.monotonic):
+        """
+        Time the body of a with block. Pass the robot's clock for robot
+        phases, so simulated moves are timed in simulated seconds.
+        """
+        bit = 1 << PHASES.index(phase)
+        self.active |= bit
+        start = clock()
+        try:
+            yield
+        finally:
+            self.record(phase, clock() - start)
+            self.active &= ~bit
+
+    def reset(self):
+        self.histograms = {}
+
+    def to_json(self):
+        return {
+            phase: {
+                "buckets": list(BUCKETS),
+                "counts": histogram.counts,
+                "count": histogram.count,
+                "sum": histogram.sum,
+                "max": histogram.max,
+            }
+            for phase, histogram in self.histograms.items()
+        }
+
+    def to_prometheus(self):
+        lines = [
+            "# HELP robot_phase_seconds Duration of each phase of a robot move",
+            "# TYPE robot_phase_seconds histogram",
+        ]
+        for phase, histogram in self.histograms.items():
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ("+Inf",), histogram.counts):
+                cumulative += count
+                lines.append(
+                    f'robot_phase_seconds_bucket{{phase="{phase}",le="{bound}"}} {cumulative}'
+                )
+            lines.append(f'robot_phase_seconds_sum{{phase="{phase}"}} {histogram.sum}')
+            lines.append(f'robot_phase_seconds_count{{phase="{phase}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path):
+        """
+        Write the histograms to a file, JSON for .json paths and Prometheus
+        text otherwise
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as file_obj:
+            if path.endswith(".json"):
+                json.dump(self.to_json(), file_obj, indent=2)
+            else:
+                file_obj.write(self.to_prometheus())
+
+    def report(self):
+        total = sum(histogram.sum for histogram in self.histograms.values())
+        for phase, histogram in self.histograms.items():
+            share = histogram.sum / total if total else 0.0
+            print(
+                Fore.CYAN
+                + f"{phase:>14}: {histogram.count:4d} x {histogram.sum / histogram.count:6.3f}s "
+                + f"(max {histogram.max:.3f}s, {share:.0%} of the time)"
+            )
+
+
+# Timings of the current game, shared by the robot API and the game loop
+TIMINGS = PhaseTimings()
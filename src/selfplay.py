@@ -0,0 +1,159 @@
+"""
+Headless engine-vs-engine games for tuning the difficulty table and budgets.
+
+Plays N games in a process pool, one Stockfish session per worker process,
+without the robot, the camera or any prompts. Every finished game is written
+as one JSON line with the result and the engine time of every move.
+
+    python selfplay.py --games 200 --white medium --black expert
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing.util import Finalize
+import chess
+import yaml
+from colorama import Fore
+from engine.uci import EngineSession, search_limit
+
+# Each worker process owns one Stockfish session for all of its games
+_session = None
+
+
+def _init_worker(stockfish_path, threads, hash_mb):
+    global _session
+    _session = EngineSession(stockfish_path, None, threads=threads, hash_mb=hash_mb)
+    # Quit the engine when the pool shuts the worker down, otherwise the
+    # session's thread keeps the worker process alive
+    Finalize(_session, _session.close, exitpriority=10)
+
+
+def play_game(number, players, max_plies):
+    """
+    Play one game. players maps chess.WHITE and chess.BLACK to (level, ELO,
+    budget). Returns the game record.
+    """
+    _session.new_game()
+    board = chess.Board()
+    move_ms = []
+    while not board.is_game_over(claim_draw=True) and len(board.move_stack) < max_plies:
+        _, elo_rating, budget = players[board.turn]
+        start = time.perf_counter()
+        move, _ = _session.search(board, search_limit(budget), elo_rating)
+        move_ms.append(round((time.perf_counter() - start) * 1000))
+        board.push_uci(move)
+
+    outcome = board.outcome(claim_draw=True)
+    return {
+        "game": number,
+        "white": {"level": players[chess.WHITE][0], "elo": players[chess.WHITE][1]},
+        "black": {"level": players[chess.BLACK][0], "elo": players[chess.BLACK][1]},
+        "result": board.result(claim_draw=True),
+        "termination": outcome.termination.name if outcome else "MAX_PLIES",
+        "plies": len(board.move_stack),
+        "moves": " ".join(move.uci() for move in board.move_stack),
+        "move_ms": move_ms,
+    }
+
+
+def player(level, config, rng):
+    """
+    (level, ELO, budget) of a difficulty level from config.yaml, or of the
+    random ELO zero player mode uses
+    """
+    budgets = config["engine"]["budget"]
+    if level == "zero_player":
+        step = config["engine_cache"]["elo_step"]
+        return level, rng.randrange(2000, 3001, step), budgets["zero_player"]
+    return level, config["stockfish_difficulty_level"][level], budgets[level]
+
+
+def summarize(records):
+    scores = {}  # level -> [points, games]
+    move_ms = []
+    for record in records:
+        # Games stopped at --max-plies count as draws
+        points = {"1-0": (1, 0), "0-1": (0, 1)}.get(record["result"], (0.5, 0.5))
+        for side, point in zip(("white", "black"), points):
+            level = record[side]["level"]
+            scores.setdefault(level, [0.0, 0])
+            scores[level][0] += point
+            scores[level][1] += 1
+        move_ms.extend(record["move_ms"])
+    for level, (points, games) in scores.items():
+        print(Fore.CYAN + f"{level}: {points:g}/{games} points ({points / games:.0%})")
+    if move_ms:
+        move_ms.sort()
+        p95 = move_ms[int(0.95 * (len(move_ms) - 1))]
+        print(
+            Fore.CYAN
+            + f"Engine time per move: mean {sum(move_ms) / len(move_ms):.0f} ms, p95 {p95} ms"
+        )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Play headless engine-vs-engine games")
+    parser.add_argument("--games", type=int, default=10)
+    parser.add_argument(
+        "--white", default="zero_player", help="easy, medium, expert, gm or zero_player"
+    )
+    parser.add_argument(
+        "--black", default="zero_player", help="easy, medium, expert, gm or zero_player"
+    )
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--threads", type=int, default=1, help="search threads per engine")
+    parser.add_argument("--max-plies", type=int, default=400)
+    parser.add_argument("--seed", type=int, default=None, help="seed of the zero_player ELOs")
+    parser.add_argument("--output", default="selfplay.jsonl")
+    parser.add_argument("--config", default="config.yaml")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    with open(args.config, "r", encoding="utf-8") as file_obj:
+        config = yaml.safe_load(file_obj)
+    stockfish_path = shutil.which("stockfish")
+    if stockfish_path is None:
+        raise Exception("No binary or executable found for stockfish")
+
+    rng = random.Random(args.seed)
+    games = []
+    for number in range(args.games):
+        players = {
+            chess.WHITE: player(args.white, config, rng),
+            chess.BLACK: player(args.black, config, rng),
+        }
+        games.append((number, players, args.max_plies))
+
+    start = time.perf_counter()
+    records = []
+    with ProcessPoolExecutor(
+        max_workers=min(args.workers, args.games),
+        initializer=_init_worker,
+        initargs=(stockfish_path, args.threads, config["engine"]["hash"]),
+    ) as pool, open(args.output, "w", encoding="utf-8") as output:
+        futures = [pool.submit(play_game, *game) for game in games]
+        for future in as_completed(futures):
+            record = future.result()
+            records.append(record)
+            output.write(json.dumps(record, separators=(",", ":")) + "\n")
+            output.flush()
+            print(
+                Fore.GREEN
+                + f"Game {record['game']}: {record['result']} after {record['plies']} plies "
+                + f"({record['termination'].lower()})"
+            )
+
+    elapsed = time.perf_counter() - start
+    print(Fore.GREEN + f"{len(records)} games in {elapsed:.1f}s, written to {args.output}")
+    summarize(records)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Concurrent startup of the engine, robot links and vision, with a timeline.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from colorama import Fore
+
+
+class StartupTimeline:
+    def __init__(self):
+        self.start = time.monotonic()
+        self.pool = ThreadPoolExecutor(thread_name_prefix="startup")
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.sealed = False
+
+    def elapsed(self):
+        return time.monotonic() - self.start
+
+    def launch(self, name, function, *args):
+        """
+        Start initializing a resource in the background and return its future.
+        Callers block on future.result() only when they first need the resource.
+        """
+        with self.lock:
+            self.pending += 1
+
+        def run():
+            begin = self.elapsed()
+            try:
+                result = function(*args)
+            except Exception as error:
+                print(Fore.RED + f"[{begin:6.2f}s -> {self.elapsed():6.2f}s] {name} failed: {error}")
+                self._finished()
+                raise
+            print(Fore.LIGHTBLACK_EX + f"[{begin:6.2f}s -> {self.elapsed():6.2f}s] {name} ready")
+            self._finished()
+            return result
+
+        return self.pool.submit(run)
+
+    def seal(self):
+        """
+        No more resources will be launched, print the total once all are ready
+        """
+        with self.lock:
+            self.sealed = True
+            done = self.pending == 0
+        if done:
+            self._report()
+
+    def _finished(self):
+        with self.lock:
+            self.pending -= 1
+            done = self.sealed and self.pending == 0
+        if done:
+            self._report()
+
+    def _report(self):
+        print(Fore.GREEN + f"Startup complete after {self.elapsed():.2f}s")
+        self.pool.shutdown(wait=False)
@@ -0,0 +1,26 @@
+"""
+Run from the src directory: python -m pytest tests
+"""
+
+import io
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from input_events import InputEvents
+
+
+def test_ask_reads_lines_queued_before_stdin_closed(monkeypatch):
+    monkeypatch.setattr(sys, "stdin", io.StringIO("e2e4\ny\n"))
+    events = InputEvents()
+    events.start_keyboard()
+    events.keyboard.join(timeout=1)  # stdin is at EOF before the first ask
+
+    assert events.ask("Move: ") == "e2e4"
+    assert events.ask("Confirm: ") == "y"
+    with pytest.raises(EOFError):
+        events.ask("Move: ")
+    events.clear()
+    with pytest.raises(EOFError):
+        events.ask("Move: ")
@@ -0,0 +1,137 @@
+"""
+One persistent grabber thread per camera.
+
+The grabber owns the capture device for the whole session and keeps reading
+into a small preallocated ring of frames, so consumers always get the newest
+frame (with its timestamp and sequence number) as a view, without reopening
+the device or copying the image.
+"""
+
+import platform
+import threading
+import time
+import cv2
+import numpy as np
+
+_grabbers = {}
+_grabbers_lock = threading.Lock()
+
+
+def open_capture(cam_index, settings):
+    """
+    Open a camera and apply the capture settings from config.yaml
+    """
+    osSystem = platform.system()  # Get the OS
+    if osSystem == "Darwin" or osSystem == "Linux":
+        cap = cv2.VideoCapture(cam_index)
+    elif osSystem == "Windows":
+        cap = cv2.VideoCapture(cam_index, cv2.CAP_DSHOW)
+    else:
+        exit("Unsupported OS")
+
+    # Format first: some drivers only offer high resolutions compressed
+    if settings.get("fourcc"):
+        cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*settings["fourcc"]))
+    if settings.get("width"):
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, settings["width"])
+    if settings.get("height"):
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, settings["height"])
+    if settings.get("fps"):
+        cap.set(cv2.CAP_PROP_FPS, settings["fps"])
+    # Keep only the newest frame in the driver so reads are never stale
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, settings.get("buffer_size", 1))
+    return cap
+
+
+class CameraGrabber(threading.Thread):
+    def __init__(self, cam_index, settings):
+        super().__init__(name=f"camera-{cam_index}", daemon=True)
+        self.cam_index = cam_index
+        self.cap = open_capture(cam_index, settings)
+        ret, image = self.cap.read()
+        if not ret:
+            self.cap.release()
+            raise IOError(f"Could not read from camera {cam_index}")
+
+        # A frame is only overwritten ring_slots - 1 frames after it was
+        # published, which gives readers that long to finish with their view.
+        ring_slots = max(2, settings.get("ring_slots", 3))
+        self.frames = np.empty((ring_slots,) + image.shape, dtype=image.dtype)
+        self.frames[0] = image
+        self.timestamps = np.zeros(ring_slots)
+        self.timestamps[0] = time.monotonic()
+        self.sequence = 0
+        self.condition = threading.Condition()
+        self.stopped = threading.Event()
+
+    @property
+    def resolution(self):
+        """
+        (width, height) of the frames
+        """
+        return self.frames.shape[2], self.frames.shape[1]
+
+    def run(self):
+        while not self.stopped.is_set():
+            slot = (self.sequence + 1) % len(self.frames)
+            ret, image = self.cap.read(self.frames[slot])
+            if not ret:
+                time.sleep(0.01)
+                continue
+            if not np.shares_memory(image, self.frames[slot]):
+                self.frames[slot] = image  # the driver allocated its own buffer
+            with self.condition:
+                self.timestamps[slot] = time.monotonic()
+                self.sequence += 1
+                self.condition.notify_all()
+        self.cap.release()
+
+    def latest(self):
+        """
+        Newest frame as a read-only view, with its timestamp and sequence number
+        """
+        with self.condition:
+            slot = self.sequence % len(self.frames)
+            frame = self.frames[slot]
+            frame.flags.writeable = False
+            return frame, self.timestamps[slot], self.sequence
+
+    def wait_next(self, sequence, timeout=1.0):
+        """
+        Wait for a frame newer than sequence and return it like latest()
+        """
+        with self.condition:
+            self.condition.wait_for(
+                lambda: self.sequence > sequence or self.stopped.is_set(), timeout
+            )
+        return self.latest()
+
+    def stop(self):
+        self.stopped.set()
+        with self.condition:
+            self.condition.notify_all()
+
+
+def get_grabber(cam_index, settings=None):
+    """
+    Return the running grabber of a camera, starting it on first use
+    """
+    with _grabbers_lock:
+        grabber = _grabbers.get(cam_index)
+        if grabber is None or grabber.stopped.is_set():
+            grabber = CameraGrabber(cam_index, settings or {})
+            grabber.start()
+            _grabbers[cam_index] = grabber
+        return grabber
+
+
+def release_all():
+    """
+    Stop every grabber and release its camera
+    """
+    with _grabbers_lock:
+        for grabber in _grabbers.values():
+            grabber.stop()
+        for grabber in _grabbers.values():
+            grabber.join(timeout=1.0)
+        _grabbers.clear()
@@ -1,12 +1,36 @@
-import platform
 import cv2
 import numpy as np
 from tkinter import *
 from PIL import Image, ImageTk, ImageDraw
-from collections import Counter
 import threading
+import time
 import os
 import sys
+from vision.voting import EMPTY, PIECE_CODES, add_votes, decode, vote_margins, vote_result
+from vision.camera import get_grabber, release_all
+from vision.pipeline import VisionPipeline, marker_records
+from vision.homography import centers_to_squares, corner_homography, crop_homography
+from vision.localizer import BoardLocalizer, calibration_crops
+from vision.motion import SceneWatcher
+
+
+class RateMeter:
+    """
+    Frames per second, averaged over about a second
+    """
+
+    def __init__(self):
+        self.fps = 0.0
+        self.count = 0
+        self.start = time.monotonic()
+
+    def tick(self):
+        self.count += 1
+        elapsed = time.monotonic() - self.start
+        if elapsed >= 1.0:
+            self.fps = self.count / elapsed
+            self.count = 0
+            self.start += elapsed
 
 
 class ChessViz:
@@ -26,7 +50,19 @@ class ChessViz:
         11: "R",
     }
 
-    def __init__(self, big_crop, small_crop, cam_index=1):
+    def __init__(
+        self,
+        big_crop,
+        small_crop,
+        cam_index=1,
+        camera_settings=None,
+        sampling=None,
+        pipeline=None,
+        board_outline=None,
+        localizer=None,
+        auto_detect=None,
+        events=None,
+    ):
         self.big_crop = big_crop  # [[y value, x value], sidelength]
         self.small_crop = small_crop  # [[y value, x value], sidelength]
         self.cam_index = cam_index
@@ -37,23 +73,69 @@ class ChessViz:
         if self.x_origin < 0 or self.y_origin < 0:
             raise Exception("big crop's origin must be larger in both x and y")
 
-        # takes picture and determines resolution width and height
-        # from picture dimensions
-        osSystem = platform.system()  # Get the OS
-        if osSystem == "Darwin" or osSystem == "Linux":
-            cam = cv2.VideoCapture(cam_index)
-        elif osSystem == "Windows":
-            cam = cv2.VideoCapture(cam_index, cv2.CAP_DSHOW)
+        # marker centers map to squares through a homography: calibrated from
+        # the pixel corners of the board when known, else the small crop
+        if board_outline is not None:
+            self.homography = corner_homography(board_outline)
         else:
-            exit("Unsupported OS")
-        ret, image = cam.read()
-        self.resolution_width = image.shape[1]
-        self.resolution_height = image.shape[0]
+            self.homography = crop_homography(
+                self.y_origin, self.x_origin, self.small_crop[1] // 8
+            )
+
+        # the shared grabber keeps the camera open for the whole session,
+        # resolution width and height come from its frames. With detector
+        # processes the pipeline's capture process owns the camera instead.
+        self.pipeline = None
+        if pipeline and pipeline["detectors"] > 0:
+            self.pipeline = VisionPipeline(
+                cam_index,
+                camera_settings,
+                self.big_crop,
+                detectors=pipeline["detectors"],
+                ring_slots=pipeline["ring_slots"],
+            )
+            self.camera = self.pipeline
+        else:
+            self.camera = get_grabber(cam_index, camera_settings)
+        self.resolution_width, self.resolution_height = self.camera.resolution
+
+        # automatic board localization replaces the configured crops, with a
+        # drift check every localizer.check_every frames while reading
+        settings = dict(localizer or {})
+        self.auto_localize = settings.pop("enabled", False)
+        self.localizer = BoardLocalizer(**settings)
+        self.calibrated_sequence = -1  # detections up to this frame used the old crop
+        if self.auto_localize:
+            calibration = self.localizer.start(self.get_image())
+            if calibration is not None:
+                self.apply_calibration(calibration)
+
         self.chess_array = None
+        self.chess_confidence = None  # per square share of frames that agree with chess_array
+        # "fixed" reads sample_size frames per board, "adaptive" stops once
+        # every square's vote is decided by vote_margin (at most max_frames)
+        self.sampling = sampling or {"mode": "fixed"}
         self.counter_on = threading.Event()
         self.counter_on.set()
         self.shutdown = threading.Event()
 
+        # "auto_detect" reads the board on its own once the scene has been
+        # still for a while after motion, and posts changed boards as
+        # "vision" events on the game's input queue (see input_events)
+        settings = dict(auto_detect or {})
+        self.auto_detect = settings.pop("enabled", False)
+        self.watcher = SceneWatcher(**settings)
+        self.events = events
+        self.still_counts = np.zeros((8, 8, PIECE_CODES + 1), dtype=np.int16)
+        self.still_frames = 0
+        self.published = None  # piece codes of the last board posted
+
+        # Latest (sequence, marker records, corners or None) of the detection
+        # loop, drawn by the optional overlay viewer on its own thread
+        self.detections = None
+        self.detect_rate = RateMeter()
+        self.view_rate = RateMeter()
+
     # For tkinter gui
     def __update_crop_params(self, crop_params, x_var, y_var, sidelength_var):
         crop_params[0][1] = int(x_var.get())
@@ -61,8 +143,8 @@ class ChessViz:
         crop_params[1] = int(sidelength_var.get())
 
     # For tkinter gui
-    def __show_frame(self, crop_params, cap, lmain):
-        _, frame = cap.read()
+    def __show_frame(self, crop_params, lmain):
+        frame, _, _ = self.camera.latest()
         cropped_frame = frame[
             crop_params[0][0] : (crop_params[0][0] + crop_params[1]),
             crop_params[0][1] : (crop_params[0][1] + crop_params[1]),
@@ -85,7 +167,7 @@ class ChessViz:
         imgtk = ImageTk.PhotoImage(image=img)
         lmain.imgtk = imgtk
         lmain.configure(image=imgtk)
-        lmain.after(10, lambda: self.__show_frame(crop_params, cap, lmain))
+        lmain.after(10, lambda: self.__show_frame(crop_params, lmain))
 
     # Uses tkinter gui to help dev find crop parameters, i.e. crop origin,
     # crop width, and crop height
@@ -95,14 +177,6 @@ class ChessViz:
         elif crop_id == 1:
             crop_params = self.small_crop
 
-        osSystem = platform.system()  # Get the OS
-        if osSystem == "Darwin" or osSystem == "Linux":
-            cap = cv2.VideoCapture(self.cam_index)
-        elif osSystem == "Windows":
-            cap = cv2.VideoCapture(self.cam_index, cv2.CAP_DSHOW)
-        else:
-            exit("Unsupported OS")
-
         root = Tk()
         root.bind("<Escape>", lambda e: root.quit())
         lmain = Label(root)
@@ -170,24 +244,12 @@ class ChessViz:
             ),
         )
 
-        self.__show_frame(crop_params, cap, lmain)  # Start showing the frame
+        self.__show_frame(crop_params, lmain)  # Start showing the frame
         root.mainloop()  # Start the GUI
 
-        cap.release()
-
     def get_image(self):
-        osSystem = platform.system()  # Get the OS
-        if osSystem == "Darwin" or osSystem == "Linux":
-            cam = cv2.VideoCapture(self.cam_index)
-        elif osSystem == "Windows":
-            cam = cv2.VideoCapture(self.cam_index, cv2.CAP_DSHOW)
-        else:
-            exit("Unsupported OS")
-        result, image = cam.read()
-        cam.release()
-        if not result:
-            raise "Error taking image"
-
+        # newest frame from the grabber, as a read-only view
+        image, _, _ = self.camera.latest()
         return image
 
     def get_crop(self, image, crop_params):
@@ -196,10 +258,42 @@ class ChessViz:
             crop_params[0][1] : (crop_params[0][1] + crop_params[1]),
         ]
 
-    # TODO: Uses canny edge detection to set crop_width, crop_height,
-    # and crop_origin automatically
-    def find_chessboard():
-        pass
+    def apply_calibration(self, calibration):
+        """
+        Use the crops and square mapping of a board calibration
+        """
+        big_crop, small_crop = calibration_crops(calibration.outline, calibration.resolution)
+        (big_y, big_x), _ = big_crop
+        self.homography = corner_homography(calibration.outline - (big_x, big_y))
+        self.big_crop, self.small_crop = big_crop, small_crop
+        self.y_origin = small_crop[0][0] - big_y
+        self.x_origin = small_crop[0][1] - big_x
+        if self.pipeline:
+            self.pipeline.set_crop(big_crop)
+        self.calibrated_sequence = self.camera.latest()[2]
+
+    def find_chessboard(self):
+        """
+        Localize the board in the newest frame (corner markers, else its
+        contour), use and cache it. Returns the calibration or None.
+        """
+        calibration = self.localizer.relocalize(self.get_image())
+        if calibration is not None:
+            self.apply_calibration(calibration)
+        return calibration
+
+    def check_board(self):
+        """
+        Cheap drift check of the calibration, with a full localization only
+        when the board has moved. True if the calibration changed.
+        """
+        if self.localizer.check(self.get_image()) is not False:
+            return False
+        print("Board moved, localizing again")
+        if self.find_chessboard() is None:
+            print("Board not found, keeping the last calibration")
+            return False
+        return True
 
     def get_center(self, corners):
         corners = corners.reshape((4, 2))
@@ -216,126 +310,205 @@ class ChessViz:
         center_x = int((top_left[1] + bottom_right[1]) / 2.0)
         return (center_y, center_x)
 
-    def modified_step(self, value, div, min, max):
-        value = value // div
-        if value > max:
-            value = max
-        if value < min:
-            value = min
-
-        return value
-
-    def get_chess_piece(self, center_y, center_x, id, chess_array):
-        if id[0] >= 0 and id[0] < 12:
-            # subtract relative origin of small from centers
-            center_y = center_y - self.y_origin
-            center_x = center_x - self.x_origin
-
-            # divide center y and x by square width to acquire
-            # square coordinates
-            square_len = self.small_crop[1] // 8
-            center_y = self.modified_step(center_y, square_len, 0, 7)
-            center_x = self.modified_step(center_x, square_len, 0, 7)
-
-            # convert square coordinates to chess array
-            chess_array[center_y, center_x] = self.CHESS_DICT[id[0]]
-
-        return chess_array
-
     def resize_image(self, image, factor):
         # Get the original image dimensions
         h, w = image.shape[:2]
         return cv2.resize(image, (round(factor * w), round(factor * h)))
 
+    def detect(self, crop):
+        """
+        ArUco marker corners and ids in a crop of the board
+        """
+        corners, ids, _ = cv2.aruco.detectMarkers(crop, self.ARUCO_DICT)
+        return corners, ids
+
+    def vote(self, records, chess_array):
+        """
+        Write the piece code of every marker record (id, center x, center y)
+        into a sample, all markers in one vectorized mapping. Markers off the
+        board, such as captured pieces in the graveyard, are skipped.
+        """
+        records = records[(records[:, 0] >= 0) & (records[:, 0] < PIECE_CODES)]
+        if len(records):
+            squares, on_board = centers_to_squares(records[:, 1:], self.homography)
+            squares = squares[on_board]
+            chess_array[squares[:, 0], squares[:, 1]] = records[on_board, 0]
+        return chess_array
+
+    def draw_overlay(self, frame, records, corners=None):
+        """
+        Draw the center and id of every detected marker, and its outline when
+        the corners are known (detection on the vision thread)
+        """
+        if corners is not None:
+            # Extract the marker corners as integer (x,y) pairs
+            outlines = [corner.reshape((4, 2)).astype(np.int32) for corner in corners]
+            cv2.polylines(frame, outlines, True, (0, 255, 0), 2)
+        for marker_id, center_x, center_y in records.tolist():
+            # Draw the center and the ArUco marker ID on the video frame
+            cv2.circle(frame, (center_x, center_y), 4, (0, 0, 255), -1)
+            cv2.putText(
+                frame,
+                str(marker_id),
+                (center_x - 10, center_y - 15),
+                cv2.FONT_HERSHEY_SIMPLEX,
+                0.5,
+                (0, 255, 0),
+                2,
+            )
+        return frame
+
+    def overlay_thread(self, max_fps):
+        """
+        Debug viewer: draws the latest frame and detections at most max_fps
+        times per second, so the detection loop never waits for the display
+        """
+        period = 1.0 / max_fps
+        while not self.shutdown.is_set():
+            start = time.monotonic()
+            image, _, _ = self.camera.latest()
+            # the grabber's frame is shared, draw the overlay on a copy
+            frame = self.get_crop(image, self.big_crop).copy()
+            detections = self.detections
+            if detections is not None:
+                self.draw_overlay(frame, detections[1], detections[2])
+            cv2.putText(
+                frame,
+                f"detect {self.detect_rate.fps:.0f} fps, view {self.view_rate.fps:.0f} fps",
+                (10, 20),
+                cv2.FONT_HERSHEY_SIMPLEX,
+                0.5,
+                (255, 255, 0),
+                1,
+            )
+            cv2.imshow("frame", frame)
+            cv2.waitKey(1)
+            self.view_rate.tick()
+            remaining = period - (time.monotonic() - start)
+            if remaining > 0:
+                time.sleep(remaining)
+        cv2.destroyWindow("frame")
+
+    def start_overlay(self, max_fps=10):
+        viewer = threading.Thread(
+            target=self.overlay_thread, args=(max_fps,), name="overlay", daemon=True
+        )
+        viewer.start()
+        return viewer
+
+    def sampling_done(self, counts, frames, sample_size):
+        if self.sampling["mode"] == "adaptive":
+            if frames >= self.sampling["max_frames"]:
+                return True
+            return vote_margins(counts).min() >= self.sampling["vote_margin"]
+        return frames >= sample_size
+
+    def watch_board(self, crop, records, sample, sample_size, now):
+        """
+        Automatic mode: collect votes while the scene is still and post the
+        board once it has settled and differs from the last one posted
+        """
+        # only piece markers count, like baseline_markers (not the corner markers)
+        pieces = int(((records[:, 0] >= 0) & (records[:, 0] < PIECE_CODES)).sum())
+        if self.watcher.moved(crop, pieces, now):
+            # votes seen under a moving hand are not trusted
+            self.still_frames = 0
+            self.still_counts.fill(0)
+            return None
+        add_votes(self.still_counts, sample)
+        self.still_frames += 1
+        if not self.watcher.settled(now):
+            return None
+        if not self.sampling_done(self.still_counts, self.still_frames, sample_size):
+            return None
+        codes, confidence = vote_result(self.still_counts)
+        if self.published is not None and (codes == self.published).all():
+            return None
+        self.published = codes
+        self.watcher.baseline_markers = int((codes != EMPTY).sum())
+        chess_array = decode(codes, self.CHESS_DICT)
+        print(f"Board changed, read from {self.still_frames} still frames")
+        if self.events is not None:
+            self.events.post("vision", (chess_array, confidence))
+        return chess_array, confidence
+
     def chess_array_update_thread(self, sample_size):
-        osSystem = platform.system()  # Get the OS
-        if osSystem == "Darwin" or osSystem == "Linux":
-            cap = cv2.VideoCapture(self.cam_index)
-        elif osSystem == "Windows":
-            cap = cv2.VideoCapture(self.cam_index, cv2.CAP_DSHOW)
-        else:
-            exit("Unsupported OS")
         lock = threading.Lock()
 
-        sample_counter = 0
-        chess_arrays = np.full((sample_size, 8, 8), ".", dtype="U1")
-        final_chess_array = np.full((8, 8), ".", dtype="U1")
+        # Running vote counts and one sample, allocated once and reused
+        frames = 0
+        counts = np.zeros((8, 8, PIECE_CODES + 1), dtype=np.int16)
+        sample = np.full((8, 8), EMPTY, dtype=np.int8)
+        sequence = -1
+        since_check = 0
 
         while not self.shutdown.is_set():
             # if event detected, counter on
-            if sample_counter >= sample_size:
-                # Iterate through each position on the board
-                for i in range(8):
-                    for j in range(8):
-                        # Collect all piece characters at the current position from all arrays
-                        pieces_at_position = [
-                            board[i, j] for board in chess_arrays if board[i, j] != "."
-                        ]
-
-                        if pieces_at_position:
-                            # Find the most common piece character at the current position
-                            most_common_piece = Counter(pieces_at_position).most_common(
-                                1
-                            )[0][0]
-                            final_chess_array[i, j] = most_common_piece
+            if frames and self.sampling_done(counts, frames, sample_size):
+                # Most common piece on all 64 squares in one pass
+                codes, confidence = vote_result(counts)
 
                 with lock:
-                    self.chess_array = final_chess_array
-
-                sample_counter = 0
-                chess_arrays = np.full((sample_size, 8, 8), ".", dtype="U1")
-                final_chess_array = np.full((8, 8), ".", dtype="U1")
+                    self.chess_array = decode(codes, self.CHESS_DICT)
+                    self.chess_confidence = confidence
+
+                print(
+                    f"Board read from {frames} frames at {self.detect_rate.fps:.1f} fps, "
+                    f"lowest square confidence {confidence.min():.0%}"
+                )
+                frames = 0
+                counts.fill(0)
                 self.counter_on.set()
 
-            ret, frame = cap.read()
-            frame = self.get_crop(frame, self.big_crop)
-            # Detect ArUco markers in the video frame
-            (corners, ids, rejected) = cv2.aruco.detectMarkers(frame, self.ARUCO_DICT)
-
-            if len(corners) > 0:
-                # Flatten the ArUco IDs list
-                # ids = ids.flatten()
-                # # Loop over the detected ArUco corners
-                for marker_corner, marker_id in zip(corners, ids):
-                    # Extract the marker corners
-                    corners = marker_corner.reshape((4, 2))
-                    (top_left, top_right, bottom_right, bottom_left) = corners
-
-                    # Convert the (x,y) coordinate pairs to integers
-                    top_right = (int(top_right[0]), int(top_right[1]))
-                    bottom_right = (int(bottom_right[0]), int(bottom_right[1]))
-                    bottom_left = (int(bottom_left[0]), int(bottom_left[1]))
-                    top_left = (int(top_left[0]), int(top_left[1]))
-
-                    # Draw the bounding box of the ArUco detection
-                    cv2.line(frame, top_left, top_right, (0, 255, 0), 2)
-                    cv2.line(frame, top_right, bottom_right, (0, 255, 0), 2)
-                    cv2.line(frame, bottom_right, bottom_left, (0, 255, 0), 2)
-                    cv2.line(frame, bottom_left, top_left, (0, 255, 0), 2)
-
-                    # Calculate and draw the center of the ArUco marker
-                    center_y = int((top_left[0] + bottom_right[0]) / 2.0)
-                    center_x = int((top_left[1] + bottom_right[1]) / 2.0)
-                    cv2.circle(frame, (center_y, center_x), 4, (0, 0, 255), -1)
-
-                    # Draw the ArUco marker ID on the video frame
-                    # The ID is always located at the top_left of the ArUco marker
-                    cv2.putText(
-                        frame,
-                        str(marker_id),
-                        (top_left[0], top_left[1] - 15),
-                        cv2.FONT_HERSHEY_SIMPLEX,
-                        0.5,
-                        (0, 255, 0),
-                        2,
-                    )
-                    if not self.counter_on.is_set():
-                        self.get_chess_piece(
-                            center_y, center_x, marker_id, chess_arrays[sample_counter]
-                        )
-
-            # Display the resulting frame
-            cv2.waitKey(1)
-            cv2.imshow("frame", frame)
-            if not self.counter_on.is_set():
-                sample_counter += 1
+            if self.pipeline:
+                # the detector processes did the detection already
+                detection = self.pipeline.next_records()
+                if detection is None:
+                    continue
+                sequence, records = detection
+                if sequence <= self.calibrated_sequence:
+                    continue  # detected in the crop before a re-localization
+                corners = None
+            else:
+                # wait for a frame we have not processed yet
+                image, _, sequence = self.camera.wait_next(sequence)
+                crop = self.get_crop(image, self.big_crop)
+                # Detection only, drawing is left to the overlay viewer
+                corners, ids = self.detect(crop)
+                records = marker_records(corners, ids)
+            self.detections = (sequence, records, corners)
+            self.detect_rate.tick()
+
+            if self.auto_localize and self.localizer.calibration is not None:
+                since_check += 1
+                if since_check >= self.localizer.check_every:
+                    since_check = 0
+                    if self.check_board():
+                        # votes so far were mapped with the old calibration
+                        frames = 0
+                        counts.fill(0)
+                        self.still_frames = 0
+                        self.still_counts.fill(0)
+                        continue
+
+            counting = not self.counter_on.is_set()
+            if counting or self.auto_detect:
+                sample.fill(EMPTY)
+                self.vote(records, sample)
+            if counting:
+                add_votes(counts, sample)
+                frames += 1
+            if self.auto_detect:
+                if self.pipeline:
+                    crop = self.get_crop(self.camera.latest()[0], self.big_crop)
+                self.watch_board(crop, records, sample, sample_size, time.monotonic())
+
+    def close(self):
+        """
+        Stop the vision threads and release the camera
+        """
+        self.shutdown.set()
+        if self.pipeline:
+            self.pipeline.stop()
+        else:
+            release_all()
@@ -1,7 +1,17 @@
-from chessviz import ChessViz
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from vision.chessviz import ChessViz
 
 viz = ChessViz([[190, 390], 410], [[230, 424], 348], cam_index=1)
 
+# Try the automatic localizer first, the GUI is left for fine tuning
+calibration = viz.find_chessboard()
+if calibration is not None:
+    print(f"Board found from {calibration.method}, cached in {viz.localizer.cache}")
+    print(f"board_corners: {viz.big_crop}, {viz.small_crop}")
+
 # 0 - big crop
 # 1 - small crop
 viz.crop_gui(1)
\ No newline at end of file
@@ -0,0 +1,57 @@
+"""
+Marker center to board square mapping through a homography.
+
+A homography H maps a pixel (x, y) of the big crop to board coordinates
+(row, column) measured in squares, with rank 1 in row 0 and file a in
+column 0. All marker centers of a frame go through one vectorized
+cv2.perspectiveTransform and a floor, so a perspective or rotated board
+view maps correctly and there is no per-marker Python work.
+"""
+
+import cv2
+import numpy as np
+
+# Pushes centers that land on a square edge up to the next square despite
+# float rounding, like the integer division the mapping replaces
+EDGE_EPSILON = 1e-6
+# Markers of pieces standing over the board edge still count, by this many squares
+BOARD_MARGIN = 0.5
+
+
+def crop_homography(y_origin, x_origin, square_len):
+    """
+    Homography of the axis-aligned small crop: row = (x - y_origin) // len,
+    column = (y - x_origin) // len, which is the mapping ChessViz used before
+    the board was calibrated
+    """
+    return np.array(
+        [
+            [1 / square_len, 0, -y_origin / square_len],
+            [0, 1 / square_len, -x_origin / square_len],
+            [0, 0, 1],
+        ]
+    )
+
+
+def corner_homography(corners):
+    """
+    Homography from the pixel positions (in the big crop) of the outer board
+    corners at a1, h1, h8 and a8
+    """
+    board = np.array([[0, 0], [0, 8], [8, 8], [8, 0]], dtype=np.float32)
+    return cv2.getPerspectiveTransform(np.asarray(corners, dtype=np.float32), board).astype(
+        np.float64
+    )
+
+
+def centers_to_squares(centers, homography, margin=BOARD_MARGIN):
+    """
+    (row, column) of every (x, y) pixel center, and a mask of the centers
+    that lie on the board. Centers up to margin squares past the edge count
+    as on the board and are clamped to the edge square; anything further out
+    (e.g. a captured piece in the graveyard next to the h-file) is off it.
+    """
+    points = np.asarray(centers, dtype=np.float64).reshape(-1, 1, 2)
+    board = cv2.perspectiveTransform(points, homography).reshape(-1, 2)
+    on_board = np.all((board >= -margin) & (board < 8 + margin), axis=1)
+    return np.clip(np.floor(board + EDGE_EPSILON), 0, 7).astype(np.intp), on_board
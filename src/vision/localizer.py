@@ -0,0 +1,211 @@
+"""
+Automatic board localization.
+
+The board is found in a full camera frame from four corner ArUco markers
+stuck just outside a1, h1, h8 and a8 (inner marker corner on the board
+corner), or, without them, as the largest four-sided contour in the frame.
+The outline is cached to disk with the camera resolution, so a restart
+reuses it after one cheap check. While the game runs, a drift check every
+few frames looks for the board corners in small windows around where they
+should be, and only a board that has moved triggers a full localization.
+
+With the default orientation of ChessViz, a1 is the top-left corner of the
+image, h1 bottom-left, h8 bottom-right and a8 top-right.
+"""
+
+import json
+import os
+from collections import namedtuple
+import cv2
+import numpy as np
+
+# Outline: pixel corners [x, y] of a1, h1, h8 and a8 in the full frame
+Calibration = namedtuple("Calibration", ["method", "resolution", "outline"])
+
+
+def order_corners(points):
+    """
+    Quadrilateral corners in the order a1, h1, h8, a8 of the default orientation
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(4, 2)
+    sums = points.sum(axis=1)
+    differences = points[:, 1] - points[:, 0]
+    return points[[sums.argmin(), differences.argmax(), sums.argmax(), differences.argmin()]]
+
+
+def calibration_crops(outline, resolution):
+    """
+    big_crop and small_crop ([[y, x], side]) around an outline: the small
+    crop is the bounding square of the board, the big crop adds half a
+    square of margin, both kept inside the frame
+    """
+    width, height = resolution
+    (x_min, y_min), (x_max, y_max) = outline.min(axis=0), outline.max(axis=0)
+    side = int(np.ceil(max(x_max - x_min, y_max - y_min)))
+    small_crop = [[int(y_min), int(x_min)], min(side, width - int(x_min), height - int(y_min))]
+
+    margin = side // 16
+    big_side = min(side + 2 * margin, width, height)
+    big_x = max(0, min(int(x_min) - margin, width - big_side))
+    big_y = max(0, min(int(y_min) - margin, height - big_side))
+    return [[big_y, big_x], big_side], small_crop
+
+
+class BoardLocalizer:
+    def __init__(
+        self,
+        corner_ids=(40, 41, 42, 43),
+        cache="board_calibration.json",
+        check_every=60,
+        drift_tolerance=6,
+        dictionary=cv2.aruco.DICT_4X4_50,
+    ):
+        self.corner_ids = list(corner_ids)
+        self.cache = cache
+        self.check_every = check_every
+        self.drift_tolerance = drift_tolerance
+        self.dictionary = cv2.aruco.getPredefinedDictionary(dictionary)
+        self.calibration = None
+
+    def _gray(self, image):
+        return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+
+    def _marker_corners(self, gray, center=None, offset=(0, 0)):
+        """
+        Inner corner (closest to the board center) of every corner marker
+        found in gray, by marker id, in full frame pixels. Without a center,
+        the board center is taken between the markers found.
+        """
+        corners, ids, _ = cv2.aruco.detectMarkers(gray, self.dictionary)
+        if ids is None:
+            return {}
+        markers = {
+            int(marker_id): marker.reshape(4, 2) + offset
+            for marker, marker_id in zip(corners, ids.reshape(-1))
+            if marker_id in self.corner_ids
+        }
+        if center is None and markers:
+            center = np.mean([points.mean(axis=0) for points in markers.values()], axis=0)
+        return {
+            marker_id: points[np.linalg.norm(points - center, axis=1).argmin()]
+            for marker_id, points in markers.items()
+        }
+
+    def _from_markers(self, gray):
+        found = self._marker_corners(gray)
+        if len(found) < 4:
+            return None
+        return np.array([found[marker_id] for marker_id in self.corner_ids])
+
+    def _from_contour(self, gray, min_area=0.1):
+        """
+        Largest convex quadrilateral covering at least min_area of the image
+        """
+        edges = cv2.Canny(cv2.GaussianBlur(gray, (5, 5), 0), 50, 150)
+        edges = cv2.dilate(edges, None)
+        contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        for contour in sorted(contours, key=cv2.contourArea, reverse=True):
+            if cv2.contourArea(contour) < min_area * gray.size:
+                break
+            polygon = cv2.approxPolyDP(contour, 0.02 * cv2.arcLength(contour, True), True)
+            if len(polygon) == 4 and cv2.isContourConvex(polygon):
+                return order_corners(polygon)
+        return None
+
+    def localize(self, image):
+        """
+        Find the board in a full frame, a new Calibration or None
+        """
+        gray = self._gray(image)
+        resolution = (gray.shape[1], gray.shape[0])
+        outline = self._from_markers(gray)
+        if outline is not None:
+            return Calibration("markers", resolution, outline)
+        outline = self._from_contour(gray)
+        if outline is not None:
+            return Calibration("contour", resolution, outline)
+        return None
+
+    def check(self, image):
+        """
+        True if the board is still where it was calibrated, False if it has
+        moved, None if that cannot be told (corners hidden by a hand)
+        """
+        calibration = self.calibration
+        gray = self._gray(image)
+        outline = calibration.outline
+        center = outline.mean(axis=0)
+        window = int(np.linalg.norm(outline[2] - outline[0]) / 8)  # about a square diagonal
+
+        if calibration.method == "contour":
+            x, y = np.maximum(outline.min(axis=0).astype(int) - window, 0)
+            x_end, y_end = outline.max(axis=0).astype(int) + window
+            found = self._from_contour(gray[y:y_end, x:x_end])
+            if found is None:
+                return None
+            drift = np.linalg.norm(found + (x, y) - outline, axis=1)
+        else:
+            drift = []
+            for marker_id, corner in zip(self.corner_ids, outline):
+                x, y = np.maximum(corner.astype(int) - window, 0)
+                roi = gray[y : y + 2 * window, x : x + 2 * window]
+                found = self._marker_corners(roi, center, offset=(x, y))
+                if marker_id in found:
+                    drift.append(np.linalg.norm(found[marker_id] - corner))
+            if not drift:
+                return None
+        return bool(np.max(drift) <= self.drift_tolerance)
+
+    def load(self, resolution):
+        """
+        Cached calibration for this camera resolution, or None
+        """
+        if not self.cache or not os.path.exists(self.cache):
+            return None
+        with open(self.cache, "r", encoding="utf-8") as file_obj:
+            saved = json.load(file_obj)
+        if tuple(saved["resolution"]) != tuple(resolution):
+            return None
+        return Calibration(saved["method"], tuple(saved["resolution"]), np.array(saved["outline"]))
+
+    def save(self, calibration):
+        if not self.cache:
+            return
+        with open(self.cache, "w", encoding="utf-8") as file_obj:
+            json.dump(
+                {
+                    "method": calibration.method,
+                    "resolution": list(calibration.resolution),
+                    "outline": calibration.outline.tolist(),
+                },
+                file_obj,
+            )
+
+    def relocalize(self, image):
+        """
+        Full localization that replaces and caches the calibration when the
+        board is found, None otherwise
+        """
+        calibration = self.localize(image)
+        if calibration is not None:
+            self.calibration = calibration
+            self.save(calibration)
+        return calibration
+
+    def start(self, image):
+        """
+        Calibration for a freshly opened camera: the cached one if the check
+        does not show the board has moved, else a full localization
+        """
+        resolution = (image.shape[1], image.shape[0])
+        self.calibration = self.load(resolution)
+        if self.calibration is not None and self.check(image) is not False:
+            print(f"Board calibration loaded from {self.cache} ({self.calibration.method})")
+            return self.calibration
+        self.calibration = None
+        calibration = self.relocalize(image)
+        if calibration is not None:
+            print(f"Board localized from {calibration.method}")
+        else:
+            print("Board not found, using the configured crops")
+        return calibration
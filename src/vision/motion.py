@@ -0,0 +1,58 @@
+"""
+Motion and occlusion over the board, for registering moves without the button.
+
+Every frame the board crop is shrunk to a small grayscale thumbnail and
+compared with the previous one. Enough thumbnail pixels changing by more
+than motion_threshold gray levels is motion (a hand or the robot arm
+moving over the board), and a frame that shows clearly fewer
+markers than the last reading is occluded (a hand held still over the
+pieces). The scene counts as settled once neither has happened for
+stable_time seconds.
+"""
+
+import cv2
+
+
+class SceneWatcher:
+    def __init__(
+        self,
+        motion_threshold=25,
+        motion_area=0.01,
+        occlusion_markers=2,
+        stable_time=0.3,
+        thumbnail=64,
+    ):
+        self.motion_threshold = motion_threshold
+        self.motion_area = motion_area
+        self.occlusion_markers = occlusion_markers
+        self.stable_time = stable_time
+        self.size = (thumbnail, thumbnail)
+        self.previous = None
+        self.current = None
+        self.last_motion = None
+        self.baseline_markers = None  # markers seen in the last board reading
+
+    def moved(self, crop, markers, now):
+        """
+        True if the frame shows motion or occlusion, which restarts the
+        stable time
+        """
+        gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY) if crop.ndim == 3 else crop
+        # reuse the two thumbnail buffers instead of allocating one per frame
+        self.previous, self.current = self.current, self.previous
+        self.current = cv2.resize(gray, self.size, dst=self.current, interpolation=cv2.INTER_AREA)
+        moving = (
+            self.previous is None
+            or (cv2.absdiff(self.current, self.previous) > self.motion_threshold).mean()
+            > self.motion_area
+            or (
+                self.baseline_markers is not None
+                and markers < self.baseline_markers - self.occlusion_markers
+            )
+        )
+        if moving:
+            self.last_motion = now
+        return moving
+
+    def settled(self, now):
+        return self.last_motion is not None and now - self.last_motion >= self.stable_time
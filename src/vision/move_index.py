@@ -0,0 +1,118 @@
+"""
+Occupancy-diff index for inferring the human's move from the vision array.
+
+The index is built once per position from python-chess bitboards. Every legal
+move is stored with the squares it changes and the pieces expected on them,
+and is looked up by the 64-bit occupancy mask and the per-piece masks of the
+position it leads to, so a vision array is matched in O(1).
+"""
+
+import chess
+import numpy as np
+
+# Order of the per-piece masks, white pieces first
+SYMBOLS = "PNBRQKpnbrqk"
+SQUARE_BITS = 1 << np.arange(64, dtype=np.uint64)
+
+
+class MoveDiff:
+    def __init__(self, move, changes):
+        self.move = move
+        self.changes = changes  # [(square, expected symbol or None), ...]
+        self.changed_mask = 0
+        for square, _ in changes:
+            self.changed_mask |= chess.BB_SQUARES[square]
+
+
+def move_changes(board, move):
+    """
+    Squares a legal move changes and the piece expected on each afterwards
+    """
+    piece = board.piece_at(move.from_square)
+    if move.promotion:
+        piece = chess.Piece(move.promotion, piece.color)
+    changes = [(move.from_square, None), (move.to_square, piece.symbol())]
+
+    if board.is_en_passant(move):
+        # the captured pawn sits behind the target square
+        captured = move.to_square - 8 if piece.color == chess.WHITE else move.to_square + 8
+        changes.append((captured, None))
+    elif board.is_castling(move):
+        rank = chess.square_rank(move.from_square)
+        if board.is_kingside_castling(move):
+            rook_from, rook_to = chess.square(7, rank), chess.square(5, rank)
+        else:
+            rook_from, rook_to = chess.square(0, rank), chess.square(3, rank)
+        rook = chess.Piece(chess.ROOK, piece.color).symbol()
+        changes.append((rook_from, None))
+        changes.append((rook_to, rook))
+    return changes
+
+
+def board_masks(board):
+    """
+    Per-piece bitboards of a python-chess board in SYMBOLS order
+    """
+    return tuple(
+        board.pieces_mask(chess.Piece.from_symbol(symbol).piece_type, symbol.isupper())
+        for symbol in SYMBOLS
+    )
+
+
+def array_masks(chess_array):
+    """
+    Per-piece bitboards of an (8, 8) vision array, rank 1 in row 0
+    """
+    squares = np.asarray(chess_array).reshape(64)
+    return tuple(
+        int(np.bitwise_or.reduce(SQUARE_BITS[squares == symbol], initial=np.uint64(0)))
+        for symbol in SYMBOLS
+    )
+
+
+def apply_changes(masks, changes):
+    masks = list(masks)
+    for square, symbol in changes:
+        bb = chess.BB_SQUARES[square]
+        for i in range(len(masks)):
+            masks[i] &= ~bb
+        if symbol is not None:
+            masks[SYMBOLS.index(symbol)] |= bb
+    return tuple(masks)
+
+
+class MoveIndex:
+    def __init__(self, board):
+        self.fen = board.fen()
+        self.masks = board_masks(board)
+        self.diffs = []
+        # occupancy after the move -> {per-piece masks after the move: MoveDiff}
+        self.by_occupancy = {}
+        for move in board.legal_moves:
+            diff = MoveDiff(move, move_changes(board, move))
+            after = apply_changes(self.masks, diff.changes)
+            occupied = 0
+            for mask in after:
+                occupied |= mask
+            self.by_occupancy.setdefault(occupied, {})[after] = diff
+            self.diffs.append(diff)
+
+    def unchanged(self, chess_array):
+        """
+        True if vision sees the position itself, i.e. no move was made
+        """
+        return array_masks(chess_array) == self.masks
+
+    def match(self, chess_array):
+        """
+        The legal move that leads to the position seen by vision, or None
+        """
+        masks = array_masks(chess_array)
+        occupied = 0
+        for mask in masks:
+            occupied |= mask
+        candidates = self.by_occupancy.get(occupied)
+        if candidates is None:
+            return None
+        diff = candidates.get(masks)
+        return diff.move if diff is not None else None
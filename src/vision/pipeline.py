@@ -0,0 +1,227 @@
+"""
+Multi-process vision pipeline.
+
+A capture process owns the camera and reads frames straight into a ring of
+slots in shared memory. It hands (sequence, slot) work items to a pool of
+detector processes, which run ArUco detection on the board crop of their
+slot and send compact detection records back over a queue: one int16 row
+(marker id, center x, center y) per marker. Detection runs outside the game
+process, so it does not compete for the GIL and scales with cores.
+
+A frame is skipped when every detector is busy, and a detection is dropped
+when its slot was overwritten during detection. The board crop lives in
+shared memory too, so a re-localized board takes effect on the next frame.
+"""
+
+import multiprocessing as mp
+import queue
+import time
+from multiprocessing import shared_memory
+import cv2
+import numpy as np
+from vision.camera import open_capture
+
+ARUCO_DICT = cv2.aruco.DICT_4X4_50
+
+
+def marker_records(corners, ids):
+    """
+    (n, 3) int16 array of marker id, center x and center y in pixels, with the
+    center halfway between the top-left and bottom-right corners (truncated
+    like ChessViz.get_center), ready for vision.homography.centers_to_squares
+    """
+    if ids is None or len(ids) == 0:
+        return np.empty((0, 3), dtype=np.int16)
+    points = np.trunc(np.asarray(corners, dtype=np.float32).reshape(-1, 4, 2))
+    records = np.empty((len(points), 3), dtype=np.int16)
+    records[:, 0] = np.asarray(ids).reshape(-1)
+    records[:, 1:] = np.trunc((points[:, 0] + points[:, 2]) / 2)
+    return records
+
+
+class FrameRing:
+    """
+    Frames, sequence numbers and timestamps of a ring of slots in one
+    shared memory block. A slot's sequence is -1 while it is being written.
+    """
+
+    def __init__(self, shm, shape, slots):
+        self.shm = shm
+        self.sequences = np.ndarray((slots,), dtype=np.int64, buffer=shm.buf)
+        self.timestamps = np.ndarray(
+            (slots,), dtype=np.float64, buffer=shm.buf, offset=8 * slots
+        )
+        self.frames = np.ndarray(
+            (slots,) + tuple(shape), dtype=np.uint8, buffer=shm.buf, offset=16 * slots
+        )
+
+    @staticmethod
+    def size(shape, slots):
+        return 16 * slots + slots * int(np.prod(shape))
+
+    @classmethod
+    def create(cls, shape, slots):
+        shm = shared_memory.SharedMemory(create=True, size=cls.size(shape, slots))
+        ring = cls(shm, shape, slots)
+        ring.sequences[:] = -1
+        return ring
+
+    @classmethod
+    def attach(cls, name, shape, slots):
+        return cls(shared_memory.SharedMemory(name=name), shape, slots)
+
+    def close(self):
+        # The arrays must go before the buffer they point into
+        del self.sequences, self.timestamps, self.frames
+        self.shm.close()
+
+
+def capture_process(cam_index, settings, slots, ready, work, latest, stop):
+    cap = open_capture(cam_index, settings)
+    ret, image = cap.read()
+    if not ret:
+        cap.release()
+        ready.put(None)
+        return
+    ring = FrameRing.create(image.shape, slots)
+    ring.frames[0] = image
+    ring.timestamps[0] = time.monotonic()
+    ring.sequences[0] = 0
+    ready.put((ring.shm.name, image.shape))
+    sequence = 0
+    try:
+        while not stop.is_set():
+            slot = (sequence + 1) % slots
+            ring.sequences[slot] = -1  # readers must not trust this slot now
+            ret, image = cap.read(ring.frames[slot])
+            if not ret:
+                if isinstance(cam_index, str):
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, 0)  # a recorded video loops
+                time.sleep(0.01)
+                continue
+            if not np.shares_memory(image, ring.frames[slot]):
+                ring.frames[slot] = image  # the driver allocated its own buffer
+            sequence += 1
+            ring.timestamps[slot] = time.monotonic()
+            ring.sequences[slot] = sequence
+            latest.value = sequence
+            try:
+                work.put_nowait((sequence, slot))
+            except queue.Full:
+                pass  # every detector is busy, skip this frame
+    finally:
+        cap.release()
+        ring.close()
+        ring.shm.unlink()
+
+
+def detector_process(name, shape, slots, crop, work, results, stop):
+    ring = FrameRing.attach(name, shape, slots)
+    dictionary = cv2.aruco.getPredefinedDictionary(ARUCO_DICT)
+    try:
+        while not stop.is_set():
+            try:
+                sequence, slot = work.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if ring.sequences[slot] != sequence:
+                continue  # overwritten before we got to it
+            y, x, side = crop[:]  # [y, x, side], see VisionPipeline.set_crop
+            image = ring.frames[slot, y : y + side, x : x + side]
+            corners, ids, _ = cv2.aruco.detectMarkers(image, dictionary)
+            if ring.sequences[slot] != sequence:
+                continue  # overwritten while we were detecting
+            results.put((sequence, marker_records(corners, ids)))
+    finally:
+        ring.close()
+
+
+class VisionPipeline:
+    def __init__(self, cam_index, settings, crop, detectors=2, ring_slots=8):
+        # spawn on every OS, so no process inherits the game's threads
+        context = mp.get_context("spawn")
+        self.slots = max(ring_slots, detectors + 2)
+        self.stop_event = context.Event()
+        self.latest_sequence = context.RawValue("q", 0)
+        self.work = context.Queue(maxsize=detectors)
+        self.results = context.Queue()
+        self.crop = context.RawArray("i", 3)
+        self.set_crop(crop)
+        ready = context.Queue()
+
+        self.capture = context.Process(
+            target=capture_process,
+            args=(
+                cam_index,
+                settings or {},
+                self.slots,
+                ready,
+                self.work,
+                self.latest_sequence,
+                self.stop_event,
+            ),
+            name=f"capture-{cam_index}",
+            daemon=True,
+        )
+        self.capture.start()
+        info = ready.get(timeout=30)
+        if info is None:
+            self.capture.join()
+            raise IOError(f"Could not read from camera {cam_index}")
+        name, shape = info
+        self.ring = FrameRing.attach(name, shape, self.slots)
+
+        self.detectors = [
+            context.Process(
+                target=detector_process,
+                args=(name, shape, self.slots, self.crop, self.work, self.results, self.stop_event),
+                name=f"detector-{i}",
+                daemon=True,
+            )
+            for i in range(detectors)
+        ]
+        for detector in self.detectors:
+            detector.start()
+
+    def set_crop(self, crop):
+        """
+        Board crop ([[y, x], side]) the detectors work on from the next frame
+        """
+        (y, x), side = crop
+        self.crop[:] = [y, x, side]
+
+    @property
+    def resolution(self):
+        """
+        (width, height) of the frames
+        """
+        return self.ring.frames.shape[2], self.ring.frames.shape[1]
+
+    def latest(self):
+        """
+        Newest frame as a read-only view, with its timestamp and sequence
+        number, like CameraGrabber.latest
+        """
+        sequence = self.latest_sequence.value
+        slot = sequence % self.slots
+        frame = self.ring.frames[slot]
+        frame.flags.writeable = False
+        return frame, self.ring.timestamps[slot], sequence
+
+    def next_records(self, timeout=1.0):
+        """
+        Next (sequence, marker records) from the detectors, or None
+        """
+        try:
+            return self.results.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def stop(self):
+        self.stop_event.set()
+        for process in self.detectors + [self.capture]:
+            process.join(timeout=2.0)
+        try:
+            self.ring.close()
+        except BufferError:
+            pass  # a reader still holds a frame view, the mapping goes with the process
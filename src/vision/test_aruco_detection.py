@@ -1,5 +1,9 @@
+import os
+import sys
 import cv2
-from chessviz import ChessViz
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from vision.chessviz import ChessViz
 import threading
 
 sample_size=20
@@ -8,6 +12,7 @@ vision_thread = threading.Thread(target=chessviz.chess_array_update_thread,
                        args=(sample_size,))
 lock = threading.Lock()
 vision_thread.start()
+chessviz.start_overlay(max_fps=15)
 
 try:
     while True:
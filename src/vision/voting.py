@@ -0,0 +1,65 @@
+"""
+Majority voting over sampled chess arrays.
+
+Samples are stored as int8 piece codes (the marker ids used as keys of
+ChessViz.CHESS_DICT) with EMPTY for squares where no marker was seen.
+Running vote counts keep one slot per piece code plus a last slot for
+frames in which a square was empty.
+"""
+
+import numpy as np
+
+EMPTY = -1
+PIECE_CODES = 12
+ROWS, COLS = np.indices((8, 8))
+
+
+def winners(counts):
+    """
+    Most common piece code on every square, ignoring empty votes.
+    A square that never saw a marker stays EMPTY.
+    """
+    pieces = counts[..., :PIECE_CODES]
+    codes = pieces.argmax(axis=-1).astype(np.int8)
+    return np.where(pieces.max(axis=-1) > 0, codes, np.int8(EMPTY))
+
+
+def add_votes(counts, sample):
+    """
+    Add one (8, 8) sample to running (8, 8, PIECE_CODES + 1) vote counts
+    """
+    counts[ROWS, COLS, sample] += 1  # EMPTY (-1) lands in the last slot
+
+
+def vote_margins(counts):
+    """
+    How clearly every square's vote is decided: the lead of the winning piece
+    code over the runner-up, or the number of empty votes on squares that
+    never saw a marker
+    """
+    pieces = counts[..., :PIECE_CODES]
+    top_two = np.partition(pieces, PIECE_CODES - 2, axis=-1)[..., -2:]
+    lead = top_two[..., 1] - top_two[..., 0]
+    return np.where(top_two[..., 1] > 0, lead, counts[..., PIECE_CODES])
+
+
+def vote_result(counts):
+    """
+    Winning piece codes and, per square, the share of frames that agree
+    with the winner (for empty squares, the share of frames without a marker)
+    """
+    codes = winners(counts)
+    frames = counts.sum(axis=-1)
+    agreeing = np.take_along_axis(counts, (codes % (PIECE_CODES + 1))[..., np.newaxis], axis=-1)
+    confidence = agreeing[..., 0] / np.maximum(frames, 1)
+    return codes, confidence
+
+
+def decode(codes, chess_dict):
+    """
+    Convert an array of piece codes to the character array used by ChessGame
+    """
+    symbols = np.array(
+        [chess_dict[code] for code in range(PIECE_CODES)] + ["."], dtype="U1"
+    )
+    return symbols[codes]  # EMPTY (-1) indexes the trailing "."